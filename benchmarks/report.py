@@ -0,0 +1,124 @@
+"""Scaling of the benchmark results of benchmarks/run.py across commits, e.g.
+
+    python benchmarks/report.py benchmarks/results.jsonl --commits 1a2b3c4 HEAD
+
+For each case, prints the time and peak memory at each size for every commit, and the
+exponent of the power law fitted to them (time ~ residues**k). With more than one
+commit, the last column is the ratio of the last commit to the first at the largest
+size measured at both.
+"""
+import argparse
+from collections import defaultdict
+import json
+from pathlib import Path
+import subprocess
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def load_results(path: Path) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def resolve_commit(commit: str) -> str:
+    result = subprocess.run(
+        ['git', '-C', str(ROOT), 'rev-parse', '--short', commit],
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip() or commit
+
+
+def scaling_exponent(sizes: list[int], values: list[float]) -> float:
+    """Slope of log(value) against log(size), over the sizes from 200 residues up when
+    there are enough of them, where fixed costs no longer dominate.
+    """
+    points = [(n, v) for n, v in zip(sizes, values) if v]
+    large = [(n, v) for n, v in points if n >= 200]
+    if len(large) >= 2:
+        points = large
+    if len(points) < 2:
+        return float('nan')
+    n, v = np.log(np.array(points)).T
+    return np.polyfit(n, v, 1)[0]
+
+
+def _format(value: float, unit: str) -> str:
+    if value is None:
+        return f'{"-":>9s}'
+    if unit == 's':
+        return f'{value:8.3f}s'
+    return f'{value / 2**20:7.1f}MB'
+
+
+def case_name(result: dict) -> str:
+    labels = result.get('labels', 'default')
+    return result['case'] if labels == 'default' else f'{result["case"]} ({labels})'
+
+
+def _recorded_commit(commit: str, recorded: list[str]) -> str:
+    # short hashes can differ in length
+    for other in recorded:
+        if other.startswith(commit) or commit.startswith(other):
+            return other
+    return commit
+
+
+def report(results: list[dict], commits: list[str]) -> None:
+    # latest result of each (commit, case, size)
+    table: dict[tuple, dict] = {}
+    for result in results:
+        table[result['commit'], case_name(result), result['residues']] = result
+
+    recorded = list(dict.fromkeys(result['commit'] for result in results))
+    if not commits:
+        commits = recorded
+    commits = [_recorded_commit(commit, recorded) for commit in commits]
+    cases = list(dict.fromkeys(case_name(result) for result in results))
+
+    for metric, unit in [('seconds', 's'), ('peak_bytes', 'B')]:
+        print(f'\n== {metric}')
+        for case in cases:
+            by_commit = defaultdict(dict)
+            for commit in commits:
+                for (c, name, n), result in table.items():
+                    if c == commit and name == case and result[metric] is not None:
+                        by_commit[commit][n] = result[metric]
+            if not by_commit:
+                continue
+
+            sizes = sorted({n for values in by_commit.values() for n in values})
+            print(f'\n{case}')
+            print(f'{"commit":10s}' + ''.join(f'{n:>10d}' for n in sizes) + '       k')
+            for commit in commits:
+                values = by_commit.get(commit)
+                if not values:
+                    continue
+                measured = sorted(values)
+                k = scaling_exponent(measured, [values[n] for n in measured])
+                row = ''.join(' ' + _format(values.get(n), unit) for n in sizes)
+                print(f'{commit:10s}{row}  {k:6.2f}')
+
+            first, last = by_commit.get(commits[0], {}), by_commit.get(commits[-1], {})
+            shared = sorted(set(first) & set(last))
+            if len(commits) > 1 and shared:
+                n = shared[-1]
+                print(f'{commits[-1]} / {commits[0]} at {n}: {last[n] / first[n]:.2f}x')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('results', type=Path)
+    parser.add_argument(
+        '--commits', nargs='+', default=[], help='commits to compare, in order'
+    )
+    args = parser.parse_args()
+
+    report(load_results(args.results), [resolve_commit(c) for c in args.commits])
+
+
+if __name__ == '__main__':
+    main()
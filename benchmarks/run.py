@@ -0,0 +1,330 @@
+"""Time and peak memory of the analysis pipelines on synthetic structures of increasing
+size, e.g.
+
+    python benchmarks/run.py --sizes 50 500 5000 --output benchmarks/results.jsonl
+
+Each result is appended to the output file together with the commit of the source tree,
+so that runs at different commits can be compared with benchmarks/report.py. The source
+tree defaults to this checkout; pass --source to benchmark another one (e.g. a
+`git worktree` of an older commit) with the same cases and sizes.
+
+Time is the best of --repeat runs. Peak memory is measured with tracemalloc in a
+separate run, as the largest amount allocated during the run on top of what was
+allocated before it.
+"""
+import argparse
+from dataclasses import dataclass
+import datetime
+from functools import lru_cache
+import json
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+import synthetic
+
+ROOT = Path(__file__).resolve().parents[1]
+
+SIZES = [50, 100, 200, 500, 1000, 2000, 5000]
+
+# labeled atoms of the NOESY cases, see --labels
+labeled_atoms = synthetic.LABEL_SETS['default']
+
+
+@dataclass
+class Case:
+    name: str
+    # arguments of a run from the number of residues. Called before every run, so that
+    # a run does not reuse the cached properties of the data of the previous one.
+    setup: Callable[[int], tuple]
+    run: Callable
+
+
+@lru_cache(maxsize=1)
+def conformation_files(n_residues: int) -> tuple[bytes, bytes]:
+    return synthetic.conformations(n_residues)
+
+
+@lru_cache(maxsize=1)
+def dimer_file(n_residues: int) -> bytes:
+    return synthetic.dimer(n_residues)
+
+
+def clear_structure_cache() -> None:
+    try:
+        from common.structures import STRUCTURE_CACHE
+    except ImportError:  # source trees from before the structure cache
+        return
+    STRUCTURE_CACHE.clear()
+
+
+def load_chain(byte_file: bytes, chain: str = 'A', filename: str = 'bench.pdb'):
+    try:
+        from common.structures import load_pdb_file
+    except ImportError:  # source trees from before it moved out of the widgets
+        from common.widgets.pdb_loader import load_pdb_file
+
+    clear_structure_cache()
+    return load_pdb_file('bench', filename, byte_file, 0, chain)
+
+
+@lru_cache(maxsize=1)
+def conformation_chains(n_residues: int) -> tuple:
+    a, b = conformation_files(n_residues)
+    return load_chain(a, filename='a.pdb'), load_chain(b, filename='b.pdb')
+
+
+@lru_cache(maxsize=1)
+def dimer_chains(n_residues: int) -> tuple:
+    byte_file = dimer_file(n_residues)
+    return load_chain(byte_file, 'A'), load_chain(byte_file, 'B')
+
+
+def fret_data(chain_a, chain_b):
+    from fret0.app import load_data
+
+    return load_data(chain_a, chain_b, False)
+
+
+def conformation_data(chain_a, chain_b):
+    from noesy_neighbors.analysis import load_conformation_data
+
+    return load_conformation_data(chain_a, chain_b, labeled_atoms)
+
+
+def interchain_data(chain_a, chain_b):
+    from noesy_neighbors.analysis import load_interchain_data
+
+    return load_interchain_data(chain_a, chain_b, labeled_atoms)
+
+
+def filter_table_data(data: dict, key: str, symmetric: bool):
+    from noesy_neighbors.widgets.noe_map import filter_table_data
+
+    return filter_table_data(data[key], symmetric)
+
+
+def render(factory: Callable, data) -> None:
+    """Build a widget and its Bokeh models, which includes the Vega spec and data
+    sources of the charts in its visible tabs.
+    """
+    from bokeh.document import Document
+
+    factory(data).get_root(Document())
+
+
+def widget(module: str, factory: str, prepare: tuple[str, str] = None) -> Callable:
+    """Case of a widget factory, timed together with prepare, the function (module,
+    name) that prepares its data in the worker, if any.
+    """
+
+    def run(data) -> None:
+        from importlib import import_module
+
+        if prepare is not None:
+            prepare_module = import_module(prepare[0])
+            # source trees from before the chart data was prepared in the worker
+            if hasattr(prepare_module, prepare[1]):
+                data = getattr(prepare_module, prepare[1])(data)
+        render(getattr(import_module(module), factory), data)
+
+    return run
+
+
+def _fret_setup(n: int) -> tuple:
+    return (fret_data(*conformation_chains(n)),)
+
+
+def _conformation_setup(n: int) -> tuple:
+    return (conformation_data(*conformation_chains(n)),)
+
+
+def _interchain_setup(n: int) -> tuple:
+    return (interchain_data(*dimer_chains(n)),)
+
+
+CONFORMATION_CHARTS = ('noesy_neighbors.analysis', 'prepare_conformation_analyses')
+
+CASES = [
+    Case('load_pdb_file', lambda n: (conformation_files(n)[0],), load_chain),
+    Case('fret0.load_data', conformation_chains, fret_data),
+    Case('noesy.load_conformation_data', conformation_chains, conformation_data),
+    Case('noesy.load_interchain_data', dimer_chains, interchain_data),
+    Case(
+        'noesy.filter_table_data[conformation]',
+        lambda n: (*_conformation_setup(n), 'a', True),
+        filter_table_data,
+    ),
+    Case(
+        'noesy.filter_table_data[interchain]',
+        lambda n: (*_interchain_setup(n), 'delta', False),
+        filter_table_data,
+    ),
+    Case(
+        'fret0.distance_widget',
+        _fret_setup,
+        widget(
+            'fret0.widgets.distance',
+            'make_distance_widget',
+            ('fret0.widgets.distance', 'distance_data'),
+        ),
+    ),
+    Case(
+        'fret0.e_fret_widget',
+        _fret_setup,
+        widget(
+            'fret0.widgets.e_fret',
+            'make_e_fret_widget',
+            ('fret0.widgets.e_fret', 'e_fret_data'),
+        ),
+    ),
+    Case(
+        'noesy.distance_widget',
+        _conformation_setup,
+        widget(
+            'noesy_neighbors.widgets.distance',
+            'make_distance_widget',
+            CONFORMATION_CHARTS,
+        ),
+    ),
+    Case(
+        'noesy.monomer_noe_widget',
+        _conformation_setup,
+        widget(
+            'noesy_neighbors.widgets.noe_map',
+            'make_monomer_noe_widget',
+            CONFORMATION_CHARTS,
+        ),
+    ),
+    Case(
+        'noesy.scatter_widget',
+        _conformation_setup,
+        widget(
+            'noesy_neighbors.widgets.scatter',
+            'make_distance_scatter_widget',
+            CONFORMATION_CHARTS,
+        ),
+    ),
+    Case(
+        'noesy.dimer_noe_widget',
+        _interchain_setup,
+        widget(
+            'noesy_neighbors.widgets.noe_map',
+            'make_dimer_noe_widget',
+            ('noesy_neighbors.analysis', 'prepare_interchain_analyses'),
+        ),
+    ),
+]
+
+
+def time_case(case: Case, n_residues: int, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        args = case.setup(n_residues)
+        start = time.perf_counter()
+        case.run(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(case: Case, n_residues: int) -> int:
+    args = case.setup(n_residues)
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        case.run(*args)
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def source_version(source: Path) -> dict:
+    def git(*args: str) -> str:
+        return subprocess.run(
+            ['git', '-C', str(source), *args], capture_output=True, text=True
+        ).stdout.strip()
+
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'subject': git('log', '-1', '--format=%s'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+    }
+
+
+def configure(source: Path) -> None:
+    sys.path.insert(0, str(source / 'smoltools_app'))
+
+    from utils import config
+
+    config.configure_panel_extensions()
+    config.configure_plotting_libraries()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument(
+        '--cases', nargs='+', help='substrings of the names of the cases to run'
+    )
+    parser.add_argument(
+        '--labels',
+        choices=list(synthetic.LABEL_SETS),
+        default='default',
+        help='labeled methyl carbons of the NOESY cases',
+    )
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--budget',
+        type=float,
+        default=60,
+        help='skip the larger sizes of a case once a run takes longer (seconds)',
+    )
+    parser.add_argument('--source', type=Path, default=ROOT)
+    parser.add_argument('--output', type=Path, help='JSON lines file to append to')
+    parser.add_argument('--no-memory', action='store_true')
+    args = parser.parse_args()
+
+    global labeled_atoms
+    labeled_atoms = synthetic.LABEL_SETS[args.labels]
+    configure(args.source.resolve())
+    version = source_version(args.source)
+    date = datetime.datetime.now().isoformat(timespec='seconds')
+
+    cases = [
+        case
+        for case in CASES
+        if not args.cases or any(name in case.name for name in args.cases)
+    ]
+    print(f'{version["commit"]}{"+" if version["dirty"] else ""} {version["subject"]}')
+    for case in cases:
+        for n_residues in sorted(args.sizes):
+            seconds = time_case(case, n_residues, args.repeat)
+            peak = None if args.no_memory else peak_memory(case, n_residues)
+
+            memory = '' if peak is None else f'{peak / 2**20:10.1f} MB'
+            print(f'{case.name:40s} {n_residues:6d} {seconds:10.4f} s{memory}')
+            if args.output is not None:
+                record = {
+                    **version,
+                    'date': date,
+                    'python': platform.python_version(),
+                    'case': case.name,
+                    'labels': args.labels,
+                    'residues': n_residues,
+                    'seconds': seconds,
+                    'peak_bytes': peak,
+                }
+                with open(args.output, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+
+            if seconds > args.budget:
+                print(f'{case.name}: over budget, skipping larger sizes')
+                break
+
+
+if __name__ == '__main__':
+    main()
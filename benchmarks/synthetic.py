@@ -0,0 +1,94 @@
+"""Synthetic PDB files for the benchmarks.
+
+The chains are random walks of residues cycling through the methyl-bearing amino acids
+(plus Gly and Ser), so that every size has the same mix of alpha carbons and labeled
+methyl carbons. The coordinates are not a physical structure, only the number of atoms
+and the spread of their distances matter here.
+"""
+import numpy as np
+
+RESIDUES = {
+    'ILE': ['N', 'CA', 'C', 'O', 'CB', 'CG1', 'CG2', 'CD1'],
+    'LEU': ['N', 'CA', 'C', 'O', 'CB', 'CG', 'CD1', 'CD2'],
+    'VAL': ['N', 'CA', 'C', 'O', 'CB', 'CG1', 'CG2'],
+    'ALA': ['N', 'CA', 'C', 'O', 'CB'],
+    'MET': ['N', 'CA', 'C', 'O', 'CB', 'CG', 'SD', 'CE'],
+    'THR': ['N', 'CA', 'C', 'O', 'CB', 'OG1', 'CG2'],
+    'GLY': ['N', 'CA', 'C', 'O'],
+    'SER': ['N', 'CA', 'C', 'O', 'CB', 'OG'],
+}
+SEQUENCE = list(RESIDUES)
+
+# the default selection of LabeledAtomSelector
+LABELED_ATOMS = {
+    'ILE': ['CD1'],
+    'LEU': ['CD1', 'CD2'],
+    'VAL': ['CG1', 'CG2'],
+}
+
+# every labeled methyl carbon
+ALL_METHYLS = {
+    'ILE': ['CD1', 'CG2'],
+    'LEU': ['CD1', 'CD2'],
+    'VAL': ['CG1', 'CG2'],
+    'ALA': ['CB'],
+    'MET': ['CE'],
+    'THR': ['CG2'],
+}
+
+LABEL_SETS = {'default': LABELED_ATOMS, 'all': ALL_METHYLS}
+
+
+def _atom_line(
+    serial: int, atom: str, residue: str, chain: str, number: int, xyz: np.ndarray
+) -> str:
+    x, y, z = xyz
+    return (
+        f'ATOM  {serial % 100000:5d} {atom:<4s} {residue} {chain}{number:4d}    '
+        f'{x:8.3f}{y:8.3f}{z:8.3f}  1.00{0.5:6.2f}           {atom[0]}'
+    )
+
+
+def chain_coordinates(n_residues: int, rng: np.random.Generator) -> list[np.ndarray]:
+    """Atom coordinates of each residue, scattered around a random walk."""
+    trace = np.cumsum(rng.normal(0, 2.2, (n_residues, 3)), axis=0)
+    return [
+        trace[i] + rng.normal(0, 1, (len(RESIDUES[SEQUENCE[i % len(SEQUENCE)]]), 3))
+        for i in range(n_residues)
+    ]
+
+
+def pdb_bytes(chains: dict[str, list[np.ndarray]]) -> bytes:
+    """PDB file of a single model with the given chains."""
+    lines = ['MODEL        1']
+    serial = 1
+    for chain_id, residues in chains.items():
+        for i, coords in enumerate(residues):
+            residue = SEQUENCE[i % len(SEQUENCE)]
+            for atom, xyz in zip(RESIDUES[residue], coords):
+                lines.append(_atom_line(serial, atom, residue, chain_id, i + 1, xyz))
+                serial += 1
+        lines.append('TER')
+    lines += ['ENDMDL', 'END']
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def conformations(n_residues: int, seed: int = 0) -> tuple[bytes, bytes]:
+    """Two conformations of chain A with the same atoms, the second displaced by up
+    to a few angstroms.
+    """
+    rng = np.random.default_rng(seed)
+    residues = chain_coordinates(n_residues, rng)
+    moved = [coords + rng.normal(0, 1.5, coords.shape) for coords in residues]
+    return pdb_bytes({'A': residues}), pdb_bytes({'A': moved})
+
+
+def dimer(n_residues: int, seed: int = 0) -> bytes:
+    """Two chains A and B of n_residues each, in the same file."""
+    rng = np.random.default_rng(seed)
+    return pdb_bytes(
+        {
+            'A': chain_coordinates(n_residues, rng),
+            'B': chain_coordinates(n_residues, rng),
+        }
+    )
@@ -0,0 +1,322 @@
+"""Fret0 and NOESY Neighbors over many structures without the dashboards, e.g.
+
+    python smoltools_app/cli.py fret0 structures/ --reference apo.pdb --output results/
+
+Structures are taken from a directory (every .pdb file, each compared with --reference
+for the analyses of two conformations) or from a CSV manifest with the columns
+structure_a and, for the analyses of two conformations, structure_b. The manifest can
+also set model_a, chain_a, model_b, chain_b and the name of each job. Paths are
+relative to the manifest.
+
+The jobs run on a process pool and write one table of residue pairs each, named after
+the job, to the output directory. A file is only written once complete, and jobs
+whose file already exists are skipped, so an interrupted run can be resumed by running
+the same command again.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+from pathlib import Path
+import signal
+import sys
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from common.structures import ChainSpec
+from fret0.app import run_pipeline
+from noesy_neighbors.analysis import run_conformation_pipeline, run_interchain_pipeline
+from noesy_neighbors.widgets.pdb_loader import NOEOptions
+from utils.executor import MAX_WORKERS
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    PARQUET_AVAILABLE = False
+else:
+    PARQUET_AVAILABLE = True
+
+ANALYSES = ['fret0', 'noesy-conformation', 'noesy-interchain']
+
+# as selected by default in the dashboard
+LABELED_ATOMS = {'ILE': ['CD', 'CD1'], 'LEU': ['CD1', 'CD2'], 'VAL': ['CG1', 'CG2']}
+
+
+class Job(NamedTuple):
+    name: str
+    structure_a: Path
+    model_a: int
+    chain_a: str
+    structure_b: Path
+    model_b: int
+    chain_b: str
+
+
+class JobResult(NamedTuple):
+    name: str
+    rows: int = 0
+    seconds: float = 0
+    error: str = None
+
+
+def _chain_spec(structure: Path, model: int, chain: str) -> ChainSpec:
+    return ChainSpec(
+        widget_id=str(structure),
+        filename=structure.name,
+        byte_file=structure.read_bytes(),
+        model=model,
+        chain=chain,
+    )
+
+
+def _interchain_pairs(data: dict, chain_a: str, chain_b: str) -> pd.DataFrame:
+    """The pairs within NOE range in each chain and between the chains."""
+    a, b, delta = data['a'], data['b'], data['delta']
+    return pd.concat(
+        [
+            a.to_frame(a.lower_triangle).assign(chain_1=chain_a, chain_2=chain_a),
+            b.to_frame(b.lower_triangle).assign(chain_1=chain_b, chain_2=chain_b),
+            delta.to_frame_at(np.arange(len(delta.distance))).assign(
+                chain_1=chain_a, chain_2=chain_b
+            ),
+        ],
+        ignore_index=True,
+    )
+
+
+def analyze(job: Job, analysis: str, options) -> pd.DataFrame:
+    """Long-form table of the residue pairs of a job, as shown in the dashboard."""
+    spec_a = _chain_spec(job.structure_a, job.model_a, job.chain_a)
+    spec_b = _chain_spec(job.structure_b, job.model_b, job.chain_b)
+    if analysis == 'fret0':
+        table = run_pipeline(spec_a, spec_b, options)
+        return table.to_frame(table.lower_triangle)
+    if analysis == 'noesy-conformation':
+        table = run_conformation_pipeline(spec_a, spec_b, options)['delta']
+        return table.to_frame(table.lower_triangle)
+    if analysis == 'noesy-interchain':
+        data = run_interchain_pipeline(spec_a, spec_b, options)
+        return _interchain_pairs(data, job.chain_a, job.chain_b)
+    raise ValueError(f'Unknown analysis: {analysis}')
+
+
+def write_table(df: pd.DataFrame, path: Path, file_format: str) -> None:
+    # written next to the output and renamed, so that a complete file is never
+    # mistaken for a partial one when resuming
+    partial = path.with_name(f'{path.name}.tmp')
+    if file_format == 'parquet':
+        df.to_parquet(partial, index=False)
+    else:
+        df.to_csv(partial, index=False)
+    os.replace(partial, path)
+
+
+def run_job(
+    job: Job, analysis: str, options, path: Path, file_format: str
+) -> JobResult:
+    """Run in a worker process. Errors are returned as messages rather than raised, as
+    some exceptions of smoltools can not be unpickled (see utils.executor.WorkerError).
+    """
+    start = time.perf_counter()
+    try:
+        df = analyze(job, analysis, options)
+        write_table(df, path, file_format)
+    except Exception as e:
+        return JobResult(job.name, error=f'{type(e).__name__}: {e}')
+    return JobResult(job.name, rows=len(df), seconds=time.perf_counter() - start)
+
+
+def _ignore_interrupts() -> None:
+    # Ctrl-C is handled by the main process, which lets the running jobs finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def directory_jobs(
+    directory: Path, reference: Path, models: tuple[int, int], chains: tuple[str, str]
+) -> list[Job]:
+    """A job per structure of the directory: with reference (as conformation A) if
+    given, else of the two chains of the structure.
+    """
+    structures = sorted(
+        path
+        for path in directory.glob('*.pdb')
+        if reference is None or path.resolve() != reference.resolve()
+    )
+    if reference is None:
+        return [
+            Job(path.stem, path, models[0], chains[0], path, models[1], chains[1])
+            for path in structures
+        ]
+    return [
+        Job(
+            f'{reference.stem}_{path.stem}',
+            reference,
+            models[0],
+            chains[0],
+            path,
+            models[1],
+            chains[1],
+        )
+        for path in structures
+    ]
+
+
+def manifest_jobs(
+    manifest: Path, models: tuple[int, int], chains: tuple[str, str]
+) -> list[Job]:
+    rows = pd.read_csv(manifest, dtype=str, keep_default_na=False)
+    if 'structure_a' not in rows:
+        raise ValueError(f'{manifest} has no structure_a column')
+
+    jobs = []
+    for row in rows.to_dict('records'):
+        structure_a = manifest.parent / row['structure_a']
+        structure_b = manifest.parent / (row.get('structure_b') or row['structure_a'])
+        model_a = int(row.get('model_a') or models[0])
+        model_b = int(row.get('model_b') or models[1])
+        chain_a = row.get('chain_a') or chains[0]
+        chain_b = row.get('chain_b') or chains[1]
+        if row.get('name'):
+            name = row['name']
+        elif structure_a == structure_b:
+            name = f'{structure_a.stem}_{chain_a}_{chain_b}'
+        else:
+            name = f'{structure_a.stem}_{structure_b.stem}'
+        jobs.append(
+            Job(name, structure_a, model_a, chain_a, structure_b, model_b, chain_b)
+        )
+    return jobs
+
+
+def parse_labels(labels: list[str]) -> dict[str, list[str]]:
+    """Labeled atoms from RES:ATOM,ATOM arguments, e.g. ILE:CD1 LEU:CD1,CD2."""
+    labeled_atoms = {}
+    for label in labels:
+        residue, _, atoms = label.partition(':')
+        if not atoms:
+            raise ValueError(f'Labels must be given as RES:ATOM,ATOM, not {label}')
+        labeled_atoms.setdefault(residue.upper(), []).extend(
+            atom.strip().upper() for atom in atoms.split(',') if atom.strip()
+        )
+    return labeled_atoms
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('analysis', choices=ANALYSES)
+    parser.add_argument(
+        'structures', type=Path, help='directory of .pdb files, or CSV manifest'
+    )
+    parser.add_argument(
+        '--reference', type=Path, help='conformation A of the structures of a directory'
+    )
+    parser.add_argument('--output', type=Path, required=True)
+    parser.add_argument(
+        '--format',
+        choices=['parquet', 'csv'],
+        default='parquet',
+        help='Parquet requires pyarrow',
+    )
+    parser.add_argument('--model-a', type=int, default=0)
+    parser.add_argument('--model-b', type=int, default=0)
+    parser.add_argument('--chain-a', default='A')
+    parser.add_argument('--chain-b', help='defaults to A, or B for noesy-interchain')
+    parser.add_argument(
+        '--sasa',
+        action='store_true',
+        help='fret0: SASA loaded as b-factor, only residues above 0.3 are kept',
+    )
+    parser.add_argument(
+        '--labels',
+        nargs='+',
+        help='NOESY: labeled atoms as RES:ATOM,ATOM (default: the dashboard\'s)',
+    )
+    parser.add_argument(
+        '--ensemble',
+        action='store_true',
+        help='NOESY: average over all models (r^-6), ignoring the models given',
+    )
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument(
+        '--overwrite', action='store_true', help='rerun jobs with an output file'
+    )
+    args = parser.parse_args()
+
+    if args.format == 'parquet' and not PARQUET_AVAILABLE:
+        parser.error('Parquet output requires pyarrow, install it or use --format csv')
+
+    interchain = args.analysis == 'noesy-interchain'
+    models = (args.model_a, args.model_b)
+    chains = (args.chain_a, args.chain_b or ('B' if interchain else 'A'))
+    try:
+        if args.structures.is_dir():
+            if args.reference is None and not interchain:
+                parser.error(f'{args.analysis} of a directory requires --reference')
+            jobs = directory_jobs(args.structures, args.reference, models, chains)
+        else:
+            jobs = manifest_jobs(args.structures, models, chains)
+        labeled_atoms = parse_labels(args.labels) if args.labels else LABELED_ATOMS
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    names = [job.name for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        parser.error(f'Jobs must have unique names: {", ".join(duplicates)}')
+
+    if args.analysis == 'fret0':
+        options = args.sasa
+    else:
+        options = NOEOptions(labeled_atoms=labeled_atoms, ensemble=args.ensemble)
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    paths = {job.name: args.output / f'{job.name}.{args.format}' for job in jobs}
+    pending = [job for job in jobs if args.overwrite or not paths[job.name].exists()]
+    skipped = len(jobs) - len(pending)
+    print(
+        f'{len(pending)} of {len(jobs)} jobs to run ({skipped} already done)',
+        file=sys.stderr,
+    )
+
+    failed = 0
+    with ProcessPoolExecutor(
+        max_workers=args.workers, initializer=_ignore_interrupts
+    ) as executor:
+        futures = [
+            executor.submit(
+                run_job, job, args.analysis, options, paths[job.name], args.format
+            )
+            for job in pending
+        ]
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                if result.error is None:
+                    status = f'{result.rows} pairs in {result.seconds:.1f}s'
+                else:
+                    failed += 1
+                    status = f'failed, {result.error}'
+                print(
+                    f'[{done}/{len(pending)}] {result.name}: {status}', file=sys.stderr
+                )
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            print(
+                'Interrupted, finishing the running jobs. Run the same command again'
+                ' to resume.',
+                file=sys.stderr,
+            )
+            sys.exit(130)
+
+    print(
+        f'{len(pending) - failed} done, {skipped} skipped, {failed} failed',
+        file=sys.stderr,
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Process-wide cache of the results computed from a single chain (e.g. its pairwise
+distances), so that replacing one of two uploaded conformations only recomputes the
+changed side and what compares the two.
+
+Results are keyed by the content of the upload, the model and chain, the analysis and
+its options, and are shared between sessions, so they must be treated as read-only.
+With a process pool, each worker process has its own cache.
+"""
+import os
+from typing import Any, Callable, Hashable, TypeVar
+
+from Bio.PDB.Chain import Chain
+
+from common.structures import ChainSpec
+from utils import metrics
+from utils.cache import LRUCache, content_hash
+
+MAX_CACHE_BYTES = int(os.environ.get('SMOLTOOLS_CHAIN_CACHE_MB', 256)) * 2**20
+
+CHAIN_CACHE = LRUCache(max_bytes=MAX_CACHE_BYTES)
+
+T = TypeVar('T')
+
+
+def chain_result(
+    spec: ChainSpec,
+    analysis: str,
+    options: Hashable,
+    compute: Callable[[Chain], T],
+    size: Callable[[T], int],
+    load: Callable[[ChainSpec], Any] = ChainSpec.load,
+) -> T:
+    """Result of compute for the chain of spec, loading the chain only if the result
+    is not cached yet. size estimates the memory footprint of a result. load can
+    load something else for compute, e.g. the chain in every model (ChainSpec.models).
+    """
+    if spec.byte_file is None:
+        # raises NoFileSelected
+        return compute(load(spec))
+
+    key = (content_hash(spec.byte_file), spec.model, spec.chain, analysis, options)
+    result = CHAIN_CACHE.get(key)
+    if result is None:
+        with metrics.stage('parse'):
+            chain = load(spec)
+        result = compute(chain)
+        CHAIN_CACHE.put(key, result, size=size(result))
+
+    return result
@@ -0,0 +1,199 @@
+"""Block aggregation of long-form pairwise tables for rendering large heatmaps."""
+import os
+from typing import Callable, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from common.pairwise import PairwiseSource
+
+# maximum number of rows/columns drawn in a heatmap before neighbouring ids are binned
+MAX_HEATMAP_IDS = int(os.environ.get('SMOLTOOLS_MAX_HEATMAP_IDS', 150))
+
+
+def _residue_order(ids: np.ndarray) -> np.ndarray:
+    """Order of ids (e.g. ILE12 or ILE12-CD1) by residue number, stable within a
+    residue.
+    """
+    numbers = (
+        pd.Series(ids, dtype=object)
+        .str.extract(r'^\D*(\d+)', expand=False)
+        .astype(float)
+        .to_numpy()
+    )
+    return np.argsort(numbers, kind='stable')
+
+
+def id_positions(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the ids of a pairwise table ordered by residue number, so that blocks of
+    consecutive ids are runs of neighbouring residues, and the position of id_1 and
+    id_2 of each row in that order.
+    """
+    ids = pd.unique(np.concatenate([df.id_1.to_numpy(), df.id_2.to_numpy()]))
+    ids = ids[_residue_order(ids)]
+    index = pd.Index(ids)
+    return ids, index.get_indexer(df.id_1), index.get_indexer(df.id_2)
+
+
+def _block_ids(
+    ids: np.ndarray, blocks: np.ndarray, block_size: int, last: bool = False
+) -> np.ndarray:
+    """First (or last) id of each block of block_size consecutive ids."""
+    if last:
+        return ids[np.minimum((blocks + 1) * block_size, len(ids)) - 1]
+    return ids[blocks * block_size]
+
+
+def downsample_pairs(
+    df: pd.DataFrame,
+    priority: Callable[[pd.DataFrame], pd.Series],
+    max_ids: int = MAX_HEATMAP_IDS,
+) -> pd.DataFrame:
+    """Bin consecutive ids into at most max_ids blocks per axis and keep one
+    representative pair per block of the heatmap.
+
+    The representative is the pair with the highest priority (e.g. the largest
+    |delta_distance| or the shortest distance), relabelled so the result can be passed
+    to the same plotting functions as the full table: id_1 with the first id of its
+    block and id_2 with the last. A cell on the diagonal thus keeps id_1 < id_2, and is
+    not dropped by the plots that only draw the lower triangle.
+    """
+    ids, position_1, position_2 = id_positions(df)
+    if len(ids) <= max_ids:
+        return df
+
+    block_size = -(-len(ids) // max_ids)
+    block_1 = position_1 // block_size
+    block_2 = position_2 // block_size
+
+    representatives = (
+        df.assign(
+            _block_1=block_1,
+            _block_2=block_2,
+            _priority=priority(df),
+            _order=np.arange(len(df)),
+        )
+        .sort_values('_priority', ascending=False, kind='stable')
+        .drop_duplicates(['_block_1', '_block_2'])
+        .sort_values('_order')
+    )
+    return representatives.assign(
+        id_1=_block_ids(ids, representatives._block_1.to_numpy(), block_size),
+        id_2=_block_ids(
+            ids, representatives._block_2.to_numpy(), block_size, last=True
+        ),
+    ).drop(columns=['_block_1', '_block_2', '_priority', '_order'])
+
+
+def downsample_window(
+    source: PairwiseSource,
+    start: int,
+    end: int,
+    priority: Callable[[pd.DataFrame], pd.Series],
+    max_ids: int = MAX_HEATMAP_IDS,
+) -> pd.DataFrame:
+    """Same as downsample_pairs applied to the long-form table of the ids at positions
+    start to end of a pairwise source, without expanding the whole window. Only one
+    row of blocks is expanded at a time.
+    """
+    positions = np.arange(start, end + 1)
+    n_ids = len(positions)
+    if n_ids <= max_ids:
+        return source.frame(
+            np.tile(positions, n_ids), np.repeat(positions, n_ids)
+        ).reset_index(drop=True)
+
+    block_size = -(-n_ids // max_ids)
+    representatives = []
+    for block_start in range(start, end + 1, block_size):
+        rows = np.arange(block_start, min(block_start + block_size, end + 1))
+        position_1 = np.tile(rows, n_ids)
+        position_2 = np.repeat(positions, len(rows))
+        block = source.frame(position_1, position_2)
+        representatives.append(
+            block.assign(
+                _position_1=position_1[block.index],
+                _position_2=position_2[block.index],
+                _priority=priority(block),
+            )
+            .assign(_block_2=lambda x: (x._position_2 - start) // block_size)
+            .sort_values('_priority', ascending=False, kind='stable')
+            .drop_duplicates('_block_2')
+        )
+
+    representatives = pd.concat(representatives).sort_values(
+        ['_position_2', '_position_1']
+    )
+    window = source.ids[start : end + 1]
+    return (
+        representatives.assign(
+            id_1=_block_ids(
+                window,
+                (representatives._position_1.to_numpy() - start) // block_size,
+                block_size,
+            ),
+            id_2=_block_ids(
+                window, representatives._block_2.to_numpy(), block_size, last=True
+            ),
+        )
+        .drop(columns=['_position_1', '_position_2', '_priority', '_block_2'])
+        .reset_index(drop=True)
+    )
+
+
+class HeatmapData(NamedTuple):
+    """A pairwise table or source prepared for a Heatmap: its ids in residue order,
+    the positions of the ids of each pair of a long-form table, and the frame drawn
+    when zoomed out. Prepared off the event loop, e.g. in the worker of a pipeline.
+    """
+
+    data: pd.DataFrame | PairwiseSource
+    ids: np.ndarray
+    position_1: np.ndarray | None
+    position_2: np.ndarray | None
+    frame: pd.DataFrame
+
+    def window(
+        self,
+        start: int,
+        end: int,
+        priority: Callable[[pd.DataFrame], pd.Series],
+        max_ids: int = MAX_HEATMAP_IDS,
+    ) -> pd.DataFrame:
+        """Frame of the pairs of the ids at positions start to end, binned."""
+        end = min(end, len(self.ids) - 1)
+        if isinstance(self.data, PairwiseSource):
+            return downsample_window(self.data, start, end, priority, max_ids)
+
+        if start == 0 and end == len(self.ids) - 1:
+            window = self.data
+        else:
+            window = self.data.loc[
+                (self.position_1 >= start)
+                & (self.position_1 <= end)
+                & (self.position_2 >= start)
+                & (self.position_2 <= end)
+            ]
+        return downsample_pairs(window, priority, max_ids)
+
+
+def prepare_heatmap(
+    data: pd.DataFrame | PairwiseSource,
+    priority: Callable[[pd.DataFrame], pd.Series],
+    max_ids: int = MAX_HEATMAP_IDS,
+) -> HeatmapData:
+    if isinstance(data, PairwiseSource):
+        heatmap = HeatmapData(data, data.ids, None, None, None)
+    else:
+        heatmap = HeatmapData(data, *id_positions(data), None)
+    return heatmap._replace(
+        frame=heatmap.window(0, len(heatmap.ids) - 1, priority, max_ids)
+    )
+
+
+def largest_change(column: str) -> Callable[[pd.DataFrame], pd.Series]:
+    return lambda x: x[column].abs()
+
+
+def shortest_distance(x: pd.DataFrame) -> pd.Series:
+    return -x.distance
@@ -0,0 +1,575 @@
+"""Pairwise tables stored as float32 arrays instead of long-form DataFrames.
+
+A long-form pairwise table has one row (id_1, id_2, value) per ordered pair of ids, with
+the ids repeated as strings on every row. The tables here keep the ids once and the
+values as float32 arrays indexed by integer id positions, and only expand to long form
+for the pairs that are displayed (see to_frame, and frame for heatmap windows).
+"""
+from functools import cached_property
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+import scipy.spatial.distance as ssd
+
+# rough in-memory footprint of an id string and its reference in an object array
+BYTES_PER_ID = 100
+
+
+def condensed_index(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Position of the pair (i, j), i < j, in a condensed upper triangle of n ids
+    (the order of scipy.spatial.distance.pdist).
+    """
+    i = np.asarray(i, dtype=np.int64)
+    j = np.asarray(j, dtype=np.int64)
+    return n * i - i * (i + 1) // 2 + (j - i - 1)
+
+
+def condensed_pairs(n: int, k: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Inverse of condensed_index: the id positions (i, j) of condensed positions k."""
+    k = np.asarray(k, dtype=np.int64)
+    root = np.sqrt(4 * n * (n - 1) - 8 * k - 7) / 2 - 0.5
+    i = n - 2 - np.floor(root).astype(np.int64)
+    j = k + i + 1 - n * (n - 1) // 2 + (n - i) * (n - i - 1) // 2
+    return i, j
+
+
+class PairwiseSource:
+    """Pairwise values between the ids of a heatmap axis, expanded to long form on
+    demand.
+    """
+
+    ids: np.ndarray
+
+    def frame(self, position_1: np.ndarray, position_2: np.ndarray) -> pd.DataFrame:
+        """Long-form rows for the pairs of ids at the given positions. Pairs with no
+        value are dropped, and the remaining rows keep the index of their pair.
+        """
+        ...
+
+
+class PairwiseTable(PairwiseSource):
+    """Symmetric pairwise values stored as the condensed upper triangle of float32
+    columns. Ids are ordered by residue number, so the upper triangle holds the pairs of
+    the long-form table's lower_triangle and the pairs within a residue. Values between
+    an id and itself are not stored and read as 0 (e.g. distance, delta_distance).
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        residue_numbers: np.ndarray,
+        columns: dict[str, np.ndarray],
+    ):
+        self.ids = np.asarray(ids, dtype=object)
+        self.residue_numbers = np.asarray(residue_numbers)
+        self.columns = {
+            name: np.asarray(values, dtype=np.float32)
+            for name, values in columns.items()
+        }
+
+    @classmethod
+    def from_coordinates(
+        cls,
+        coords: pd.DataFrame,
+        residue_number: Callable[[pd.Series], pd.Series],
+    ) -> 'PairwiseTable':
+        """Pairwise distances between atoms from a coordinate table indexed by atom id.
+        residue_number extracts the residue number from the atom ids.
+        """
+        numbers = residue_number(coords.index.to_series()).to_numpy()
+        order = np.argsort(numbers, kind='stable')
+        coords = coords.iloc[order]
+        return cls(
+            ids=coords.index.to_numpy(),
+            residue_numbers=numbers[order],
+            columns={'distance': ssd.pdist(coords.to_numpy(dtype=np.float64))},
+        )
+
+    @classmethod
+    def between_conformations(
+        cls, table_a: 'PairwiseTable', table_b: 'PairwiseTable'
+    ) -> 'PairwiseTable':
+        """Distances of the ids present in both conformations, and the difference in
+        distance between the conformations.
+        """
+        if np.array_equal(table_a.ids, table_b.ids):
+            ids = table_a.ids
+            numbers = table_a.residue_numbers
+            distance_a = table_a['distance']
+            distance_b = table_b['distance']
+        else:
+            in_b = pd.Index(table_a.ids).isin(table_b.ids)
+            ids = table_a.ids[in_b]
+            numbers = table_a.residue_numbers[in_b]
+            i, j = condensed_pairs(len(ids), np.arange(len(ids) * (len(ids) - 1) // 2))
+            positions_a = np.flatnonzero(in_b)
+            positions_b = pd.Index(table_b.ids).get_indexer(ids)
+            distance_a = table_a.values('distance', positions_a[i], positions_a[j])
+            distance_b = table_b.values('distance', positions_b[i], positions_b[j])
+
+        return cls(
+            ids=ids,
+            residue_numbers=numbers,
+            columns={
+                'distance_a': distance_a,
+                'distance_b': distance_b,
+                'delta_distance': distance_a - distance_b,
+            },
+        )
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    def __len__(self) -> int:
+        return len(self.ids) * (len(self.ids) - 1) // 2
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory footprint of the ids and values."""
+        return (
+            BYTES_PER_ID * len(self.ids)
+            + self.residue_numbers.nbytes
+            + sum(values.nbytes for values in self.columns.values())
+        )
+
+    def with_columns(self, columns: dict[str, np.ndarray]) -> 'PairwiseTable':
+        """Table of other values between the same ids."""
+        table = PairwiseTable(self.ids, self.residue_numbers, columns)
+        table.lower_triangle = self.lower_triangle
+        return table
+
+    @cached_property
+    def lower_triangle(self) -> np.ndarray:
+        """Condensed mask of the pairs between different residues, i.e. the pairs in
+        the lower_triangle of the long-form table.
+        """
+        n = len(self.ids)
+        same_residue = (
+            np.searchsorted(self.residue_numbers, self.residue_numbers, side='right')
+            - np.arange(n)
+            - 1
+        )
+        mask = np.ones(len(self), dtype=bool)
+        for i in np.flatnonzero(same_residue):
+            start = condensed_index(n, i, i + 1)
+            mask[start : start + same_residue[i]] = False
+        return mask
+
+    def values(
+        self, column: str, position_1: np.ndarray, position_2: np.ndarray
+    ) -> np.ndarray:
+        i = np.minimum(position_1, position_2)
+        j = np.maximum(position_1, position_2)
+        same = i == j
+        if len(self) == 0:
+            return np.zeros(len(i), dtype=np.float32)
+
+        k = condensed_index(len(self.ids), i, np.where(same, i + 1, j))
+        return np.where(same, 0, self[column][np.where(same, 0, k)])
+
+    def frame(self, position_1: np.ndarray, position_2: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                'id_1': self.ids[position_1],
+                'id_2': self.ids[position_2],
+                **{
+                    column: self.values(column, position_1, position_2)
+                    for column in self.columns
+                },
+            }
+        )
+
+    def to_frame(self, mask: np.ndarray) -> pd.DataFrame:
+        """Long-form rows of the condensed pairs selected by mask, with id_1 the id
+        with the lower residue number.
+        """
+        return self.take(np.flatnonzero(mask))
+
+    def take(self, k: np.ndarray) -> pd.DataFrame:
+        """Long-form rows of the pairs at condensed positions k."""
+        i, j = condensed_pairs(len(self.ids), k)
+        return pd.DataFrame(
+            {
+                'id_1': self.ids[i],
+                'id_2': self.ids[j],
+                **{column: values[k] for column, values in self.columns.items()},
+            }
+        )
+
+
+class CutoffIndex:
+    """Pairs in the lower triangle of a PairwiseTable sorted by the values of one column.
+    Built once, so that the pairs passing a cutoff are a slice found by binary search
+    rather than a scan of every pair.
+    """
+
+    def __init__(self, table: PairwiseTable, column: str):
+        self.table = table
+        positions = np.flatnonzero(table.lower_triangle)
+        if len(table) < np.iinfo(np.int32).max:
+            positions = positions.astype(np.int32)
+        values = table[column][positions]
+        order = np.argsort(values, kind='stable')
+        self._positions = positions[order]
+        self._values = values[order]
+
+    def _take(self, positions: np.ndarray) -> pd.DataFrame:
+        # restore the order of the table
+        return self.table.take(np.sort(positions))
+
+    def at_least(self, cutoff: float) -> pd.DataFrame:
+        """Long-form rows of the pairs with value >= cutoff."""
+        start = np.searchsorted(self._values, np.float32(cutoff), side='left')
+        return self._take(self._positions[start:])
+
+    def magnitude_above(self, cutoff: float) -> pd.DataFrame:
+        """Long-form rows of the pairs with |value| > cutoff."""
+        end = np.searchsorted(self._values, np.float32(-cutoff), side='left')
+        start = np.searchsorted(self._values, np.float32(cutoff), side='right')
+        if end >= start:
+            return self._take(self._positions)
+        return self._take(
+            np.concatenate([self._positions[:end], self._positions[start:]])
+        )
+
+
+class SplicedPairwiseTable(PairwiseSource):
+    """Distances of the ids present in two conformations, taken from the first
+    conformation where the residue number of id_1 is at most that of id_2 and from the
+    second conformation otherwise (see noesy_neighbors.splice_conformation_tables).
+    Pairs without a value in the table they are taken from (see SparsePairwiseTable)
+    are dropped.
+    """
+
+    def __init__(
+        self,
+        table_a: PairwiseTable,
+        table_b: PairwiseTable,
+        chain_a_id: str = 'A',
+        chain_b_id: str = 'B',
+    ):
+        in_b = pd.Index(table_a.ids).isin(table_b.ids)
+        self.ids = table_a.ids[in_b]
+        self._residue_numbers = table_a.residue_numbers[in_b]
+        self._table_a = table_a
+        self._table_b = table_b
+        self._positions_a = np.flatnonzero(in_b)
+        self._positions_b = pd.Index(table_b.ids).get_indexer(self.ids)
+        self._subunits = pd.CategoricalDtype(sorted({chain_a_id, chain_b_id}))
+        self._chain_a_id = chain_a_id
+        self._chain_b_id = chain_b_id
+
+    def frame(self, position_1: np.ndarray, position_2: np.ndarray) -> pd.DataFrame:
+        position_1 = np.asarray(position_1)
+        position_2 = np.asarray(position_2)
+        from_a = (
+            self._residue_numbers[position_1] <= self._residue_numbers[position_2]
+        )
+
+        distance = np.empty(len(position_1), dtype=np.float32)
+        for table, positions, rows in [
+            (self._table_a, self._positions_a, from_a),
+            (self._table_b, self._positions_b, ~from_a),
+        ]:
+            distance[rows] = table.values(
+                'distance', positions[position_1[rows]], positions[position_2[rows]]
+            )
+
+        exists = ~np.isnan(distance)
+        subunit_codes = np.where(
+            from_a[exists],
+            self._subunits.categories.get_loc(self._chain_a_id),
+            self._subunits.categories.get_loc(self._chain_b_id),
+        )
+        return pd.DataFrame(
+            {
+                'id_1': self.ids[position_1[exists]],
+                'id_2': self.ids[position_2[exists]],
+                'distance': distance[exists],
+                'subunit': pd.Categorical.from_codes(
+                    subunit_codes, dtype=self._subunits
+                ),
+            },
+            index=np.flatnonzero(exists),
+        )
+
+
+class RectangularPairwiseTable(PairwiseSource):
+    """Pairwise distances between the atoms of two different chains, stored as a
+    float32 matrix. The ids of the heatmap axis are the ids of both chains in order of
+    appearance, as in the long-form table.
+    """
+
+    def __init__(self, coords_a: pd.DataFrame, coords_b: pd.DataFrame):
+        self.ids_a = coords_a.index.to_numpy(dtype=object)
+        self.ids_b = coords_b.index.to_numpy(dtype=object)
+        self.distance = ssd.cdist(
+            coords_a.to_numpy(dtype=np.float64), coords_b.to_numpy(dtype=np.float64)
+        ).astype(np.float32)
+
+        self.ids = pd.unique(np.concatenate([self.ids_a, self.ids_b]))
+        self._rows = pd.Index(self.ids_a).get_indexer(self.ids)
+        self._columns = pd.Index(self.ids_b).get_indexer(self.ids)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        if column != 'distance':
+            raise KeyError(column)
+        return self.distance
+
+    def frame(self, position_1: np.ndarray, position_2: np.ndarray) -> pd.DataFrame:
+        rows = self._rows[position_1]
+        columns = self._columns[position_2]
+        exists = (rows >= 0) & (columns >= 0)
+        return self.to_frame_at(rows[exists], columns[exists]).set_axis(
+            np.flatnonzero(exists)
+        )
+
+    def to_frame(self, mask: np.ndarray) -> pd.DataFrame:
+        """Long-form rows of the pairs selected by a mask over the distance matrix."""
+        return self.to_frame_at(*np.nonzero(mask))
+
+    def to_frame_at(self, rows: np.ndarray, columns: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                'id_1': self.ids_a[rows],
+                'id_2': self.ids_b[columns],
+                'distance': self.distance[rows, columns],
+            }
+        )
+
+
+def _find(keys: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Positions of query in the sorted keys, -1 where absent."""
+    if len(keys) == 0:
+        return np.full(len(query), -1)
+    found = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    return np.where(keys[found] == query, found, -1)
+
+
+class SparsePairwiseTable(PairwiseSource):
+    """Distances between the ids of one chain, like PairwiseTable, but only of the
+    pairs closer than a cutoff. The pairs are found with a KD-tree, so work and memory
+    scale with the number of contacts rather than with all pairs. Pairs beyond the
+    cutoff have no value, and are dropped from frames. extra_columns are other values
+    of the same pairs (e.g. distance_sd), shown alongside the distance.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        residue_numbers: np.ndarray,
+        position_1: np.ndarray,
+        position_2: np.ndarray,
+        distance: np.ndarray,
+        cutoff: float,
+        extra_columns: dict[str, np.ndarray] = None,
+    ):
+        self.ids = np.asarray(ids, dtype=object)
+        self.residue_numbers = np.asarray(residue_numbers)
+        self.cutoff = cutoff
+
+        # sorted by condensed position, position_1 < position_2
+        keys = condensed_index(len(self.ids), position_1, position_2)
+        order = np.argsort(keys)
+        self._keys = keys[order]
+        self.position_1 = np.asarray(position_1, dtype=np.int32)[order]
+        self.position_2 = np.asarray(position_2, dtype=np.int32)[order]
+        self.distance = np.asarray(distance, dtype=np.float32)[order]
+        self.extra_columns = {
+            name: np.asarray(values, dtype=np.float32)[order]
+            for name, values in (extra_columns or {}).items()
+        }
+
+    @classmethod
+    def from_coordinates(
+        cls,
+        coords: pd.DataFrame,
+        residue_number: Callable[[pd.Series], pd.Series],
+        cutoff: float,
+    ) -> 'SparsePairwiseTable':
+        """Pairs of atoms at most cutoff apart from a coordinate table indexed by atom
+        id. residue_number extracts the residue number from the atom ids.
+        """
+        numbers = residue_number(coords.index.to_series()).to_numpy()
+        order = np.argsort(numbers, kind='stable')
+        coords = coords.iloc[order]
+
+        xyz = coords.to_numpy(dtype=np.float64)
+        pairs = cKDTree(xyz).query_pairs(cutoff, output_type='ndarray')
+        position_1, position_2 = pairs[:, 0], pairs[:, 1]
+        return cls(
+            ids=coords.index.to_numpy(),
+            residue_numbers=numbers[order],
+            position_1=position_1,
+            position_2=position_2,
+            distance=np.linalg.norm(xyz[position_1] - xyz[position_2], axis=1),
+            cutoff=cutoff,
+        )
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        if column == 'distance':
+            return self.distance
+        return self.extra_columns[column]
+
+    def __len__(self) -> int:
+        return len(self.distance)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory footprint of the ids and values."""
+        return (
+            BYTES_PER_ID * len(self.ids)
+            + self.residue_numbers.nbytes
+            + self._keys.nbytes
+            + self.position_1.nbytes
+            + self.position_2.nbytes
+            + self.distance.nbytes
+            + sum(values.nbytes for values in self.extra_columns.values())
+        )
+
+    @cached_property
+    def lower_triangle(self) -> np.ndarray:
+        """Mask of the stored pairs between different residues."""
+        return (
+            self.residue_numbers[self.position_1]
+            != self.residue_numbers[self.position_2]
+        )
+
+    def values(
+        self, column: str, position_1: np.ndarray, position_2: np.ndarray
+    ) -> np.ndarray:
+        """Values of the pairs of ids at the given positions, 0 between an id and
+        itself and NaN for pairs beyond the cutoff.
+        """
+        i = np.minimum(position_1, position_2)
+        j = np.maximum(position_1, position_2)
+        same = i == j
+        found = _find(
+            self._keys, condensed_index(len(self.ids), i, np.where(same, i + 1, j))
+        )
+        values = np.where(found >= 0, self[column][found], np.nan)
+        return np.where(same, 0, values).astype(np.float32)
+
+    def frame(self, position_1: np.ndarray, position_2: np.ndarray) -> pd.DataFrame:
+        position_1 = np.asarray(position_1)
+        position_2 = np.asarray(position_2)
+        distance = self.values('distance', position_1, position_2)
+        exists = ~np.isnan(distance)
+        return pd.DataFrame(
+            {
+                'id_1': self.ids[position_1[exists]],
+                'id_2': self.ids[position_2[exists]],
+                'distance': distance[exists],
+                **{
+                    column: self.values(
+                        column, position_1[exists], position_2[exists]
+                    )
+                    for column in self.extra_columns
+                },
+            },
+            index=np.flatnonzero(exists),
+        )
+
+    def to_frame(self, mask: np.ndarray) -> pd.DataFrame:
+        """Long-form rows of the stored pairs selected by mask, with id_1 the id with
+        the lower residue number.
+        """
+        k = np.flatnonzero(mask)
+        return pd.DataFrame(
+            {
+                'id_1': self.ids[self.position_1[k]],
+                'id_2': self.ids[self.position_2[k]],
+                'distance': self.distance[k],
+                **{column: values[k] for column, values in self.extra_columns.items()},
+            }
+        )
+
+
+class SparseRectangularPairwiseTable(PairwiseSource):
+    """Distances between the atoms of two different chains, like
+    RectangularPairwiseTable, but only of the pairs closer than a cutoff, found with
+    KD-trees of both chains. rows and columns are the positions of the pairs in ids_a
+    and ids_b, and extra_columns other values of the same pairs.
+    """
+
+    def __init__(
+        self,
+        ids_a: np.ndarray,
+        ids_b: np.ndarray,
+        rows: np.ndarray,
+        columns: np.ndarray,
+        distance: np.ndarray,
+        cutoff: float,
+        extra_columns: dict[str, np.ndarray] = None,
+    ):
+        self.ids_a = np.asarray(ids_a, dtype=object)
+        self.ids_b = np.asarray(ids_b, dtype=object)
+        self.cutoff = cutoff
+
+        keys = np.asarray(rows, dtype=np.int64) * len(self.ids_b) + columns
+        order = np.argsort(keys)
+        self._keys = keys[order]
+        self.rows = np.asarray(rows)[order].astype(np.int32)
+        self.columns = np.asarray(columns)[order].astype(np.int32)
+        self.distance = np.asarray(distance)[order].astype(np.float32)
+        self.extra_columns = {
+            name: np.asarray(values)[order].astype(np.float32)
+            for name, values in (extra_columns or {}).items()
+        }
+
+        self.ids = pd.unique(np.concatenate([self.ids_a, self.ids_b]))
+        self._rows = pd.Index(self.ids_a).get_indexer(self.ids)
+        self._columns = pd.Index(self.ids_b).get_indexer(self.ids)
+
+    @classmethod
+    def from_coordinates(
+        cls, coords_a: pd.DataFrame, coords_b: pd.DataFrame, cutoff: float
+    ) -> 'SparseRectangularPairwiseTable':
+        """Pairs of atoms of the two chains at most cutoff apart, from coordinate
+        tables indexed by atom id.
+        """
+        pairs = cKDTree(coords_a.to_numpy(dtype=np.float64)).sparse_distance_matrix(
+            cKDTree(coords_b.to_numpy(dtype=np.float64)),
+            cutoff,
+            output_type='ndarray',
+        )
+        return cls(
+            ids_a=coords_a.index.to_numpy(),
+            ids_b=coords_b.index.to_numpy(),
+            rows=pairs['i'],
+            columns=pairs['j'],
+            distance=pairs['v'],
+            cutoff=cutoff,
+        )
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        if column == 'distance':
+            return self.distance
+        return self.extra_columns[column]
+
+    def frame(self, position_1: np.ndarray, position_2: np.ndarray) -> pd.DataFrame:
+        rows = self._rows[position_1]
+        columns = self._columns[position_2]
+        found = np.where(
+            (rows >= 0) & (columns >= 0),
+            _find(self._keys, rows.astype(np.int64) * len(self.ids_b) + columns),
+            -1,
+        )
+        exists = found >= 0
+        return self.to_frame_at(found[exists]).set_axis(np.flatnonzero(exists))
+
+    def to_frame(self, mask: np.ndarray) -> pd.DataFrame:
+        """Long-form rows of the stored pairs selected by mask."""
+        return self.to_frame_at(np.flatnonzero(mask))
+
+    def to_frame_at(self, k: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                'id_1': self.ids_a[self.rows[k]],
+                'id_2': self.ids_b[self.columns[k]],
+                'distance': self.distance[k],
+                **{column: values[k] for column, values in self.extra_columns.items()},
+            }
+        )
@@ -0,0 +1,104 @@
+"""Uploaded PDB structures: the chains selected from them, and a process-wide cache of
+parsed structures keyed by the content of the upload.
+"""
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+from Bio.PDB.Chain import Chain
+from Bio.PDB.Structure import Structure
+from smoltools.pdbtools import load, select
+from smoltools.pdbtools.exceptions import ChainNotFound, NoResiduesFound, NoAtomsFound
+
+from utils.cache import LRUCache, content_hash
+
+# rough in-memory footprint of one parsed Biopython Atom and its parent entities
+BYTES_PER_ATOM = 1_000
+MAX_CACHE_BYTES = int(os.environ.get('SMOLTOOLS_STRUCTURE_CACHE_MB', 256)) * 2**20
+
+STRUCTURE_CACHE = LRUCache(max_bytes=MAX_CACHE_BYTES)
+
+
+class NoFileSelected(Exception):
+    def __init__(self, input_id: str):
+        message = f'Please select pdb file for {input_id}'
+        super().__init__(message)
+
+
+# errors in the structures or chains selected, shown to the user as they are
+INPUT_ERRORS = (NoFileSelected, ChainNotFound, NoResiduesFound, NoAtomsFound)
+
+
+def _estimate_size(structure: Structure) -> int:
+    return BYTES_PER_ATOM * sum(1 for _ in structure.get_atoms())
+
+
+def read_structure(structure_id: str, byte_file: bytes) -> Structure:
+    """Parse uploaded PDB bytes into a Structure, re-using the already parsed Structure
+    if the same file has been uploaded before. Cached structures are shared between
+    sessions and must be treated as read-only.
+    """
+    digest = content_hash(byte_file)
+    key = (structure_id, digest)
+
+    structure = STRUCTURE_CACHE.get(key)
+    if structure is None:
+        structure = load.read_pdb_from_bytes(structure_id, byte_file)
+        structure.xtra['digest'] = digest
+        STRUCTURE_CACHE.put(key, structure, size=_estimate_size(structure))
+
+    return structure
+
+
+class ChainSpec(NamedTuple):
+    widget_id: str
+    filename: str
+    byte_file: bytes
+    model: int | None
+    chain: str
+
+    def load(self) -> Chain:
+        return load_pdb_file(
+            widget_id=self.widget_id,
+            filename=self.filename,
+            byte_file=self.byte_file,
+            model=self.model,
+            chain=self.chain,
+        )
+
+    def models(self) -> list[Chain]:
+        """The chain in every model of the file, ignoring model."""
+        return load_pdb_models(
+            widget_id=self.widget_id,
+            filename=self.filename,
+            byte_file=self.byte_file,
+            chain=self.chain,
+        )
+
+    @property
+    def chain_id(self) -> str:
+        """structure/model/chain, with the structure named after the file."""
+        return f'{Path(self.filename).stem}/{self.model}/{self.chain}'
+
+
+def load_pdb_file(
+    widget_id: str, filename: str, byte_file: bytes, model: int, chain: str
+) -> Chain:
+    try:
+        structure = read_structure(Path(filename).stem, byte_file)
+        return select.get_chain(structure, model, chain)
+    except (TypeError, AttributeError):
+        raise NoFileSelected(widget_id)
+    except KeyError:
+        structure_id = Path(filename).stem
+        raise ChainNotFound(structure_id, model, chain)
+
+
+def load_pdb_models(
+    widget_id: str, filename: str, byte_file: bytes, chain: str
+) -> list[Chain]:
+    try:
+        structure = read_structure(Path(filename).stem, byte_file)
+        return [select.get_chain(structure, model.id, chain) for model in structure]
+    except (TypeError, AttributeError):
+        raise NoFileSelected(widget_id)
@@ -0,0 +1,91 @@
+from typing import Callable
+
+import altair as alt
+import pandas as pd
+import panel as pn
+from panel.viewable import Viewer
+import panel.widgets as pnw
+
+from common.downsample import MAX_HEATMAP_IDS, HeatmapData, prepare_heatmap
+from common.pairwise import PairwiseSource
+from common.widgets.vega import ColumnarVega
+
+
+class Heatmap(Viewer):
+    """Heatmap of a long-form pairwise table with adaptive level of detail.
+
+    Tables with more than max_ids ids per axis are binned server-side before being sent
+    to the browser. Zooming in on a window of ids re-renders that window, at full
+    resolution once it is small enough. Pairwise sources are only expanded to long form
+    for the window being displayed. The data can be given as HeatmapData prepared with
+    the same priority and max_ids, so that only the chart is built on the event loop.
+    """
+
+    def __init__(
+        self,
+        data: pd.DataFrame | PairwiseSource | HeatmapData,
+        plot: Callable[[pd.DataFrame], alt.Chart],
+        priority: Callable[[pd.DataFrame], pd.Series],
+        max_ids: int = MAX_HEATMAP_IDS,
+        **params,
+    ):
+        super().__init__(**params)
+        self._priority = priority
+        self._max_ids = max_ids
+        self._zoom = pnw.IntRangeSlider(name='Zoom', step=1, width=400)
+        self._zoom.param.watch(self._update, 'value_throttled')
+        self._detail = pnw.StaticText()
+        # hidden, rather than left out, while the data is small enough, so that
+        # update can show them
+        self._controls = pn.Column(
+            pn.Row(self._zoom, align='center'),
+            pn.Row(self._detail, align='center'),
+        )
+        self._pane = ColumnarVega()
+        self.update(data, plot)
+
+    def update(
+        self,
+        data: pd.DataFrame | PairwiseSource | HeatmapData,
+        plot: Callable[[pd.DataFrame], alt.Chart],
+    ) -> None:
+        """Show other data (e.g. after a change of cutoff) in the same pane, zoomed
+        out. Only the data and the parts of the spec that changed are sent.
+        """
+        if not isinstance(data, HeatmapData):
+            data = prepare_heatmap(data, self._priority, self._max_ids)
+        self._data = data
+        self._plot = plot
+        self._ids = data.ids
+
+        last = max(len(self._ids) - 1, 1)
+        self._zoom.param.update(start=0, end=last, value=(0, last))
+        self._controls.visible = self.is_downsampled
+        if self.is_downsampled:
+            self._detail.value = self._describe(0, last)
+        self._pane.object = self._plot(data.frame)
+
+    @property
+    def is_downsampled(self) -> bool:
+        return len(self._ids) > self._max_ids
+
+    def _describe(self, start: int, end: int) -> str:
+        block_size = -(-(end - start + 1) // self._max_ids)
+        description = f'{self._ids[start]} to {self._ids[end]}'
+        if block_size > 1:
+            description += (
+                f' (most significant pair of every {block_size}x{block_size} block'
+                ' shown, zoom in for full detail)'
+            )
+        return description
+
+    def _update(self, event) -> None:
+        start, end = event.new
+        if self.is_downsampled:
+            self._detail.value = self._describe(start, end)
+        self._pane.object = self._plot(
+            self._data.window(start, end, self._priority, self._max_ids)
+        )
+
+    def __panel__(self) -> pn.Column:
+        return pn.Column(self._controls, self._pane)
@@ -1,21 +1,22 @@
+import logging
 from pathlib import Path
+import re
 from typing import Callable
 
 import panel as pn
 from panel.viewable import Viewer
 import panel.widgets as pnw
 import string
-import time
 
 from Bio.PDB.Chain import Chain
-from smoltools.pdbtools import load, select
-from smoltools.pdbtools.exceptions import ChainNotFound
 
+from common.structures import ChainSpec
+from utils import scheduling
+from utils.scheduling import SUCCESS_DISPLAY_TIME
 
-class NoFileSelected(Exception):
-    def __init__(self, input_id: str):
-        message = f'Please select pdb file for {input_id}'
-        super().__init__(message)
+logger = logging.getLogger('smoltools.errors')
+
+UNEXPECTED_ERROR_MESSAGE = 'Something went wrong, please try again'
 
 
 def pdb_file_input() -> pnw.FileInput:
@@ -35,16 +36,30 @@ def chain_input(default: str = 'A') -> pnw.Select:
     )
 
 
+def busy_spinner() -> pn.indicators.LoadingSpinner:
+    return pn.indicators.LoadingSpinner(value=False, width=25, height=25)
+
+
 class PDBInputWidget(Viewer):
     def __panel__(self) -> pn.Column():
         ...
 
-    def chain_a(self) -> Chain:
+    @property
+    def chain_a_spec(self) -> ChainSpec:
         ...
 
-    def chain_b(self) -> Chain:
+    @property
+    def chain_b_spec(self) -> ChainSpec:
         ...
 
+    @property
+    def chain_a(self) -> Chain:
+        return self.chain_a_spec.load()
+
+    @property
+    def chain_b(self) -> Chain:
+        return self.chain_b_spec.load()
+
 
 class ConformationInputWidget(PDBInputWidget):
     def __init__(self, **params):
@@ -75,8 +90,8 @@ class ConformationInputWidget(PDBInputWidget):
         )
 
     @property
-    def chain_a(self) -> Chain:
-        return load_pdb_file(
+    def chain_a_spec(self) -> ChainSpec:
+        return ChainSpec(
             widget_id='Conformation A',
             filename=self._pdb_file_input_a.filename,
             byte_file=self._pdb_file_input_a.value,
@@ -85,8 +100,8 @@ class ConformationInputWidget(PDBInputWidget):
         )
 
     @property
-    def chain_b(self) -> Chain:
-        return load_pdb_file(
+    def chain_b_spec(self) -> ChainSpec:
+        return ChainSpec(
             widget_id='Conformation B',
             filename=self._pdb_file_input_b.filename,
             byte_file=self._pdb_file_input_b.value,
@@ -123,8 +138,8 @@ class SubunitInputWidget(PDBInputWidget):
         )
 
     @property
-    def chain_a(self) -> Chain:
-        return load_pdb_file(
+    def chain_a_spec(self) -> ChainSpec:
+        return ChainSpec(
             widget_id='the structure',
             filename=self._pdb_file_input.filename,
             byte_file=self._pdb_file_input.value,
@@ -133,8 +148,8 @@ class SubunitInputWidget(PDBInputWidget):
         )
 
     @property
-    def chain_b(self) -> Chain:
-        return load_pdb_file(
+    def chain_b_spec(self) -> ChainSpec:
+        return ChainSpec(
             widget_id='the structure',
             filename=self._pdb_file_input.filename,
             byte_file=self._pdb_file_input.value,
@@ -143,17 +158,84 @@ class SubunitInputWidget(PDBInputWidget):
         )
 
 
-def load_pdb_file(
-    widget_id: str, filename: str, byte_file: bytes, model: int, chain: str
-) -> Chain:
-    try:
-        structure = load.read_pdb_from_bytes(Path(filename).stem, byte_file)
-        return select.get_chain(structure, model, chain)
-    except (TypeError, AttributeError):
-        raise NoFileSelected(widget_id)
-    except KeyError:
-        structure_id = Path(filename).stem
-        raise ChainNotFound(structure_id, model, chain)
+def count_models(byte_file: bytes) -> int:
+    """Number of models in a PDB file, without parsing it."""
+    return max(1, len(re.findall(rb'^MODEL ', byte_file, flags=re.MULTILINE)))
+
+
+def conformation_labels(filename: str, model_ids: list[int]) -> list[str]:
+    """Names of the conformations of a file: the file name, and the model if the file
+    has more than one.
+    """
+    if len(model_ids) == 1:
+        return [Path(filename).stem]
+    return [f'{Path(filename).stem}/{i}' for i in model_ids]
+
+
+class BatchInputWidget(PDBInputWidget):
+    """Any number of conformations of a chain: every model of every uploaded file,
+    compared either all against all or against one reference conformation.
+    """
+
+    def __init__(self, **params):
+        super().__init__(**params)
+        self._pdb_file_input = pnw.FileInput(accept='.pdb', multiple=True)
+        self._chain_input = chain_input()
+        self._reference_input = pnw.Select(
+            name='Compare', options={'All pairs': None}, width=200
+        )
+        self._pdb_file_input.param.watch(self._update_references, 'value')
+
+    def __panel__(self) -> pn.Column:
+        return pn.Column(
+            pn.Row('**Conformations:**', height=30),
+            self._pdb_file_input,
+            pn.Row(
+                self._chain_input,
+                self._reference_input,
+            ),
+        )
+
+    def _update_references(self, event=None) -> None:
+        references = {f'Against {label}': i for i, label in enumerate(self.labels)}
+        self._reference_input.options = {'All pairs': None, **references}
+
+    def _files(self) -> list[tuple[str, bytes]]:
+        if not self._pdb_file_input.value:
+            return []
+        return list(zip(self._pdb_file_input.filename, self._pdb_file_input.value))
+
+    @property
+    def specs(self) -> list[ChainSpec]:
+        """A spec per file, of the chain in every model of the file (model=None), so
+        that each file is sent to a worker and parsed once.
+        """
+        return [
+            ChainSpec(
+                widget_id='the conformations',
+                filename=filename,
+                byte_file=byte_file,
+                model=None,
+                chain=self._chain_input.value,
+            )
+            for filename, byte_file in self._files()
+        ]
+
+    @property
+    def labels(self) -> list[str]:
+        """Names of the conformations of specs, counted without parsing the files."""
+        return [
+            label
+            for filename, byte_file in self._files()
+            for label in conformation_labels(filename, range(count_models(byte_file)))
+        ]
+
+    @property
+    def reference(self) -> str | None:
+        """Name of the reference conformation, None to compare all pairs."""
+        if self._reference_input.value is None:
+            return None
+        return self.labels[self._reference_input.value]
 
 
 class OptionsWidget(Viewer):
@@ -180,18 +262,43 @@ class PDBLoader(Viewer):
 
         self._button = pnw.Button(name='Upload', button_type='primary', width=150)
         self._status = pnw.StaticText()
+        self._spinner = busy_spinner()
+        self._reset_callback = None
 
     def bind_button(self, function: Callable[..., None]) -> None:
         self._button.on_click(function)
 
+    def show_busy(self) -> None:
+        scheduling.cancel(self._reset_callback)
+        self._spinner.value = True
+        self._status.value = 'Running... (click Upload again to restart)'
+
     def show_error(self, error: Exception) -> None:
+        scheduling.cancel(self._reset_callback)
+        self._spinner.value = False
         self._button.button_type = 'warning'
         self._status.value = f'Error: {error.args[0]}'
 
+    def show_unexpected_error(self, error: Exception) -> None:
+        """Logs an error that is not the user's to fix, and shows a generic message."""
+        logger.error('Unexpected error in an analysis', exc_info=error)
+        self.show_error(Exception(UNEXPECTED_ERROR_MESSAGE))
+
+    def show_progress(self, done: int, total: int) -> None:
+        self._status.value = (
+            f'Running... {done}/{total} (click Upload again to restart)'
+        )
+
     def upload_success(self) -> None:
+        self._spinner.value = False
         self._status.value = 'Success!'
         self._button.button_type = 'success'
-        time.sleep(0.5)
+        self._reset_callback = scheduling.call_later(
+            self._reset_button, delay=SUCCESS_DISPLAY_TIME
+        )
+
+    def _reset_button(self) -> None:
+        self._button.button_type = 'primary'
 
     @property
     def chain_a(self) -> Chain:
@@ -201,6 +308,14 @@ class PDBLoader(Viewer):
     def chain_b(self) -> Chain:
         return self._input_widget.chain_b
 
+    @property
+    def chain_a_spec(self) -> ChainSpec:
+        return self._input_widget.chain_a_spec
+
+    @property
+    def chain_b_spec(self) -> ChainSpec:
+        return self._input_widget.chain_b_spec
+
     @property
     def options_value(self):
         return self._options_widget.value
@@ -210,7 +325,7 @@ class PDBLoader(Viewer):
             self._about,
             self._input_widget,
             self._options_widget,
-            pn.Row(self._button, align='center'),
+            pn.Row(self._button, self._spinner, align='center'),
             pn.Row(self._status, align='center'),
             collapsible=False,
             title='Upload Structures',
@@ -2,6 +2,32 @@ from bokeh.models.widgets.tables import NumberFormatter
 import pandas as pd
 import panel.widgets as pnw
 
+ROW_HEIGHT = 30
+# height taken up by the column headers, header filters and pagination controls
+TABLE_CHROME_HEIGHT = 110
+
+
+def as_strings(data: pd.DataFrame) -> pd.DataFrame:
+    """Categorical columns (e.g. noe_strength) as strings, as the header filters of
+    Tabulator cast the filter value to the dtype of the column, which fails for
+    categoricals. data_table converts every value it is given; converting a frame
+    before assigning it saves sending the table twice.
+    """
+    categorical = {
+        column: str
+        for column in data.columns
+        if isinstance(data[column].dtype, pd.CategoricalDtype)
+    }
+    return data.astype(categorical) if categorical else data
+
+
+def _text_filters(data: pd.DataFrame) -> dict[str, dict]:
+    return {
+        column: {'type': 'input', 'func': 'like', 'placeholder': 'Filter...'}
+        for column in data.columns
+        if not pd.api.types.is_numeric_dtype(data[column])
+    }
+
 
 def data_table(
     data: pd.DataFrame,
@@ -10,19 +36,36 @@ def data_table(
     height: int = 500,
     width: int = 600,
     **params
-) -> pnw.DataFrame:
+) -> pnw.Tabulator:
+    """Read-only table that is paginated, sorted and filtered server-side, so only the
+    visible page is sent to the browser.
+    """
+    data = as_strings(data)
     formatters = {
         column: NumberFormatter(format=format) for column, format in formatters.items()
     }
 
-    return pnw.DataFrame(
+    tabulator = pnw.Tabulator(
         value=data,
         titles=titles,
         formatters=formatters,
+        header_filters=_text_filters(data),
+        pagination='remote',
+        page_size=max(1, (height - TABLE_CHROME_HEIGHT) // ROW_HEIGHT),
         show_index=False,
         width=width,
         height=height,
-        row_height=30,
+        row_height=ROW_HEIGHT,
+        layout='fit_data_fill',
         disabled=True,
         **params,
     )
+
+    # e.g. after a search or a change of cutoff
+    def _convert_value(event) -> None:
+        value = as_strings(event.new)
+        if value is not event.new:
+            tabulator.value = value
+
+    tabulator.param.watch(_convert_value, 'value')
+    return tabulator
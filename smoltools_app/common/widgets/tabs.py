@@ -0,0 +1,28 @@
+from typing import Callable
+
+import panel as pn
+from panel.viewable import Viewable
+
+from common.widgets.containers import centered_row
+
+
+def lazy_tabs(*tabs: tuple[str, Callable[[], Viewable]], **params) -> pn.Tabs:
+    """Tabs whose content is only built when a tab is first opened and is kept
+    afterwards. Only the active tab is serialized and sent to the browser.
+    """
+    titles = [title for title, _ in tabs]
+    factories = [factory for _, factory in tabs]
+    containers = [centered_row() for _ in tabs]
+    built = set()
+
+    def _build(index: int) -> None:
+        if index in built or not 0 <= index < len(containers):
+            return
+        built.add(index)
+        containers[index].objects = [factories[index]()]
+
+    layout = pn.Tabs(*zip(titles, containers), dynamic=True, **params)
+    layout.param.watch(lambda event: _build(event.new), 'active')
+    _build(layout.active)
+
+    return layout
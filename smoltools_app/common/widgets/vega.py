@@ -0,0 +1,142 @@
+"""Vega pane that transports chart data as typed column arrays instead of inline JSON.
+
+While the pane serializes a chart, the chart references its DataFrames by name (see
+columnar_data_transformer), and the pane ships each referenced DataFrame as a Bokeh
+ColumnDataSource. Numeric columns are sent as binary float32/int32 buffers over the
+websocket rather than as JSON records. Elsewhere (e.g. in a plain Vega pane or an
+export) charts use Altair's default data transformer.
+
+Within a pane, datasets are renamed after their order in the spec. Replacing the chart
+of a pane (e.g. at a new cutoff) therefore updates the data of its existing sources in
+place, and the spec is only sent again if it changed, so the browser receives a diff
+instead of a new chart.
+"""
+import itertools
+import weakref
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import panel as pn
+from bokeh.models import ColumnDataSource
+
+from utils import metrics
+
+DATASET_PREFIX = 'columnar-'
+
+_FRAMES: weakref.WeakValueDictionary[str, pd.DataFrame] = weakref.WeakValueDictionary()
+_dataset_ids = itertools.count()
+
+
+def columnar_data_transformer(data: pd.DataFrame) -> dict:
+    """Altair data transformer that references a DataFrame by name rather than
+    embedding its values. The DataFrame is kept alive by the chart that owns it.
+    """
+    name = f'{DATASET_PREFIX}{next(_dataset_ids)}'
+    _FRAMES[name] = data
+    return {'name': name}
+
+
+alt.data_transformers.register('columnar', columnar_data_transformer)
+
+
+class VegaLiteSpec(dict):
+    """Vega-Lite spec written as a dict, for features that Altair does not support
+    (e.g. params bound to inputs). Its data is referenced with columnar_data_transformer
+    and kept alive by the spec, as it would be by a chart.
+    """
+
+    def __init__(self, spec: dict, data: list[pd.DataFrame] = ()):
+        super().__init__(spec)
+        self.data = list(data)
+
+
+def _compact_column(values: pd.Series) -> np.ndarray:
+    if pd.api.types.is_float_dtype(values):
+        return values.to_numpy(dtype=np.float32)
+    elif pd.api.types.is_bool_dtype(values):
+        return values.to_numpy()
+    elif pd.api.types.is_integer_dtype(values):
+        return values.to_numpy(dtype=np.int32)
+    else:
+        return values.astype(str).to_numpy()
+
+
+def compact_columns(df: pd.DataFrame) -> dict[str, np.ndarray]:
+    return {str(column): _compact_column(values) for column, values in df.items()}
+
+
+def _referenced_datasets(spec: dict | list) -> list[str]:
+    """Names of the columnar datasets referenced in spec, in order of appearance."""
+    names = {}
+    if isinstance(spec, dict):
+        name = spec.get('name')
+        if isinstance(name, str) and name.startswith(DATASET_PREFIX):
+            names[name] = None
+        for value in spec.values():
+            names.update(dict.fromkeys(_referenced_datasets(value)))
+    elif isinstance(spec, list):
+        for value in spec:
+            names.update(dict.fromkeys(_referenced_datasets(value)))
+    return list(names)
+
+
+def _rename_datasets(spec: dict | list, names: dict[str, str]) -> dict | list:
+    if isinstance(spec, dict):
+        renamed = {key: _rename_datasets(value, names) for key, value in spec.items()}
+        if renamed.get('name') in names:
+            renamed['name'] = names[renamed['name']]
+        return renamed
+    elif isinstance(spec, list):
+        return [_rename_datasets(value, names) for value in spec]
+    return spec
+
+
+class ColumnarVega(pn.pane.Vega):
+    def __init__(self, object=None, **params):
+        # frames of the current chart by dataset name, and of each source sent
+        self._frames: dict[str, pd.DataFrame] = {}
+        self._sent: weakref.WeakKeyDictionary[ColumnDataSource, pd.DataFrame] = (
+            weakref.WeakKeyDictionary()
+        )
+        super().__init__(object, **params)
+
+    def _to_json(self, obj) -> dict:
+        with alt.data_transformers.enable('columnar'):
+            json = super()._to_json(obj)
+        names = {
+            name: f'{DATASET_PREFIX}{i}'
+            for i, name in enumerate(_referenced_datasets(json))
+        }
+        self._frames = {
+            names[name]: _FRAMES[name] for name in names if name in _FRAMES
+        }
+        return _rename_datasets(json, names)
+
+    def _is_sent(self, source: ColumnDataSource, frame: pd.DataFrame) -> bool:
+        sent = None if source is None else self._sent.get(source)
+        return sent is not None and (sent is frame or sent.equals(frame))
+
+    def _get_sources(self, json: dict, sources: dict) -> None:
+        referenced = _referenced_datasets(json)
+        for name in list(sources):
+            if name.startswith(DATASET_PREFIX) and name not in referenced:
+                del sources[name]
+
+        for name in referenced:
+            frame = self._frames.get(name)
+            source = sources.get(name)
+            if frame is None or self._is_sent(source, frame):
+                continue
+
+            columns = compact_columns(frame)
+            metrics.add_size(
+                'chart_data', sum(values.nbytes for values in columns.values())
+            )
+            if source is None:
+                source = sources[name] = ColumnDataSource(data=columns)
+            else:
+                source.data = columns
+            self._sent[source] = frame
+
+        super()._get_sources(json, sources)
@@ -1,21 +1,111 @@
+from functools import partial
+
 from Bio.PDB.Chain import Chain
 import pandas as pd
 import panel as pn
-from smoltools import fret0
-from smoltools.pdbtools.exceptions import ChainNotFound, NoResiduesFound, NoAtomsFound
+from smoltools.fret0.utils import extract_residue_number
+from smoltools.pdbtools import coordinate_table
+import smoltools.pdbtools.select as select
+
+from common.chain_results import chain_result
+from common.pairwise import PairwiseTable
+from common.structures import INPUT_ERRORS, ChainSpec
+from common.widgets.pdb_loader import BatchInputWidget, conformation_labels
+from fret0.batch import (
+    ConformationComparison,
+    ConformationNotFound,
+    TooFewConformations,
+    compare_conformations,
+)
+from fret0.widgets import r0_finder, batch, distance, e_fret, pdb_loader
+from utils import colors, config, metrics
+from utils.executor import BackgroundTask
 
-from common.widgets.pdb_loader import NoFileSelected
-from fret0.widgets import r0_finder, distance, e_fret, pdb_loader
-from utils import colors, config
 
+def alpha_carbon_coordinates(chain: Chain, sasa_cutoff: float = None) -> pd.DataFrame:
+    """Coordinates of the alpha carbons selected by fret0.chain_to_distances."""
+    residues = select.get_residues(chain)
+    alpha_carbons = select.get_alpha_carbons(residues)
+    if sasa_cutoff is not None:
+        alpha_carbons = select.filter_by_b_factor(alpha_carbons, cutoff=sasa_cutoff)
+    return (
+        coordinate_table(alpha_carbons)
+        .assign(id=lambda x: x.residue_name + x.residue_number.astype(str))
+        .set_index('id')
+        .loc[:, ['x', 'y', 'z']]
+    )
 
-def load_data(chain_a: Chain, chain_b: Chain, use_sasa: bool) -> pd.DataFrame:
+
+def alpha_carbon_distances(chain: Chain, use_sasa: bool) -> PairwiseTable:
     sasa_cutoff = 0.3 if use_sasa else None
 
-    distances_a = fret0.chain_to_distances(chain_a, sasa_cutoff)
-    distances_b = fret0.chain_to_distances(chain_b, sasa_cutoff)
+    with metrics.stage('distance'):
+        return PairwiseTable.from_coordinates(
+            alpha_carbon_coordinates(chain, sasa_cutoff), extract_residue_number
+        )
+
+
+def load_data(chain_a: Chain, chain_b: Chain, use_sasa: bool) -> PairwiseTable:
+    distances_a = alpha_carbon_distances(chain_a, use_sasa)
+    distances_b = alpha_carbon_distances(chain_b, use_sasa)
+
+    with metrics.stage('distance'):
+        return PairwiseTable.between_conformations(distances_a, distances_b)
+
+
+def chain_distances(spec: ChainSpec, use_sasa: bool) -> PairwiseTable:
+    return chain_result(
+        spec,
+        analysis='fret0',
+        options=use_sasa,
+        compute=partial(alpha_carbon_distances, use_sasa=use_sasa),
+        size=lambda table: table.nbytes,
+    )
+
+
+def _models_distances(
+    models: list[Chain], use_sasa: bool
+) -> list[tuple[int, PairwiseTable]]:
+    return [
+        (chain.get_parent().id, alpha_carbon_distances(chain, use_sasa))
+        for chain in models
+    ]
+
+
+def models_distances(
+    spec: ChainSpec, use_sasa: bool
+) -> list[tuple[int, PairwiseTable]]:
+    """Model id and distances of the chain in every model of the file of spec, parsed
+    once.
+    """
+    return chain_result(
+        spec._replace(model=None),
+        analysis='fret0_models',
+        options=use_sasa,
+        compute=partial(_models_distances, use_sasa=use_sasa),
+        size=lambda models: sum(table.nbytes for _, table in models),
+        load=ChainSpec.models,
+    )
+
 
-    return fret0.pairwise_distances_between_conformations(distances_a, distances_b)
+def run_pipeline(
+    spec_a: ChainSpec, spec_b: ChainSpec, use_sasa: bool
+) -> PairwiseTable:
+    # only a chain that has not been analysed before is loaded and measured
+    distances_a = chain_distances(spec_a, use_sasa)
+    distances_b = chain_distances(spec_b, use_sasa)
+
+    with metrics.stage('distance'):
+        return PairwiseTable.between_conformations(distances_a, distances_b)
+
+
+def run_dashboard_pipeline(
+    spec_a: ChainSpec, spec_b: ChainSpec, use_sasa: bool
+) -> tuple[distance.DistanceData, e_fret.EFretData]:
+    """run_pipeline, and the data of the tables and heatmaps of the dashboard."""
+    data = run_pipeline(spec_a, spec_b, use_sasa)
+    with metrics.stage('chart_data'):
+        return distance.distance_data(data), e_fret.e_fret_data(data)
 
 
 class Dashboard(pn.template.BootstrapTemplate):
@@ -29,30 +119,109 @@ class Dashboard(pn.template.BootstrapTemplate):
         )
         self.pdb_loader = pdb_loader.fret_pdb_loader()
         self.pdb_loader.bind_button(self.upload_files)
+        self.batch_input = BatchInputWidget()
+        self.batch_loader = pdb_loader.fret_batch_loader(self.batch_input)
+        self.batch_loader.bind_button(self.upload_batch)
+        self._task = BackgroundTask('fret0')
 
         self.r0_widget = r0_finder.make_widget()
         self.main.append(
-            pn.FlexBox(self.pdb_loader, self.r0_widget, justify_content='center'),
+            pn.FlexBox(
+                self.pdb_loader,
+                self.batch_loader,
+                self.r0_widget,
+                justify_content='center',
+            ),
         )
 
     def upload_files(self, event=None) -> None:
-        try:
-            chain_a = self.pdb_loader.chain_a
-            chain_b = self.pdb_loader.chain_b
-            use_sasa = self.pdb_loader.options_value
+        self.pdb_loader.show_busy()
+        self._task.submit(
+            run_dashboard_pipeline,
+            self.pdb_loader.chain_a_spec,
+            self.pdb_loader.chain_b_spec,
+            self.pdb_loader.options_value,
+            on_success=self._upload_success,
+            on_error=self._upload_error,
+        )
 
-            data = load_data(chain_a, chain_b, use_sasa)
+    def _upload_success(
+        self, data: tuple[distance.DistanceData, e_fret.EFretData]
+    ) -> None:
+        with metrics.stage('chart'):
             analyses = self.load_analyses(data)
-        except (NoFileSelected, ChainNotFound, NoResiduesFound, NoAtomsFound) as e:
-            self.pdb_loader.show_error(e)
+        self.pdb_loader.upload_success()
+        with metrics.stage('render'):
+            self.show_analyses(analyses)
+
+    def _upload_error(self, error: Exception) -> None:
+        if isinstance(error, INPUT_ERRORS):
+            self.pdb_loader.show_error(error)
         else:
-            self.pdb_loader.upload_success()
+            self.pdb_loader.show_unexpected_error(error)
+
+    def upload_batch(self, event=None) -> None:
+        specs = self.batch_input.specs
+        labels = self.batch_input.labels
+        reference = self.batch_input.reference
+        use_sasa = self.batch_loader.options_value
+        if len(labels) < 2:
+            self.batch_loader.show_error(TooFewConformations(len(labels)))
+            return
+
+        def _distances_done(results: list[list[tuple[int, PairwiseTable]]]) -> None:
+            # labelled by the models actually parsed, which the labels counted for the
+            # reference options only estimate
+            parsed_labels = [
+                label
+                for spec, models in zip(specs, results)
+                for label in conformation_labels(
+                    spec.filename, [model_id for model_id, _ in models]
+                )
+            ]
+            if reference is not None and reference not in parsed_labels:
+                self.batch_loader.show_error(ConformationNotFound(reference))
+                return
+            self._task.submit(
+                compare_conformations,
+                [table for models in results for _, table in models],
+                parsed_labels,
+                None if reference is None else parsed_labels.index(reference),
+                on_success=self._batch_success,
+                on_error=self._batch_error,
+            )
+
+        # the files are loaded and measured in parallel, and those analysed before
+        # are taken from the cache
+        self.batch_loader.show_busy()
+        self._task.map(
+            models_distances,
+            [(spec, use_sasa) for spec in specs],
+            on_success=_distances_done,
+            on_error=self._batch_error,
+            on_progress=self.batch_loader.show_progress,
+        )
+
+    def _batch_success(self, comparison: ConformationComparison) -> None:
+        with metrics.stage('chart'):
+            analyses = [batch.make_batch_widget(comparison), self.r0_widget]
+        self.batch_loader.upload_success()
+        with metrics.stage('render'):
             self.show_analyses(analyses)
 
-    def load_analyses(self, data: pd.DataFrame) -> list[pn.Card]:
+    def _batch_error(self, error: Exception) -> None:
+        if isinstance(error, (TooFewConformations, *INPUT_ERRORS)):
+            self.batch_loader.show_error(error)
+        else:
+            self.batch_loader.show_unexpected_error(error)
+
+    def load_analyses(
+        self, data: tuple[distance.DistanceData, e_fret.EFretData]
+    ) -> list[pn.Card]:
+        distance_data, e_fret_data = data
         return [
-            distance.make_distance_widget(data),
-            e_fret.make_e_fret_widget(data),
+            distance.make_distance_widget(distance_data),
+            e_fret.make_e_fret_widget(e_fret_data),
             self.r0_widget,
         ]
 
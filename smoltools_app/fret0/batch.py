@@ -0,0 +1,172 @@
+"""Comparison of many conformations of a chain at once, ranking the residue pairs whose
+distance, and so E_fret, differs the most between two of the conformations or from a
+reference conformation.
+"""
+import numpy as np
+import pandas as pd
+
+from common.pairwise import PairwiseTable, condensed_pairs
+from utils import metrics
+
+# pairs compared at a time, bounding the memory of the stacked distances of all the
+# conformations
+BLOCK_SIZE = 2**18
+
+RANKINGS = ['delta_E_fret', 'delta_distance', 'distance_sd']
+
+
+class TooFewConformations(Exception):
+    def __init__(self, count: int):
+        message = f'Please select at least two conformations ({count} selected)'
+        super().__init__(message)
+
+
+class ConformationNotFound(Exception):
+    def __init__(self, label: str):
+        message = f'Reference conformation {label} could not be read from its file'
+        super().__init__(message)
+
+
+def _calculate_e_fret(distance: np.ndarray, r0: float) -> np.ndarray:
+    return 1 / (1 + (distance / r0) ** 6)
+
+
+class ConformationComparison:
+    """The shortest and longest distance of each residue pair over the conformations
+    (other than the reference), and the conformations they are found in.
+
+    E_fret decreases monotonically with distance, so for any R0 the largest change in
+    E_fret of a pair is between the same conformations as its largest change in
+    distance, or, against a reference, is to one of these two conformations.
+    """
+
+    def __init__(
+        self, tables: list[PairwiseTable], labels: list[str], reference: int = None
+    ):
+        if len(tables) < 2:
+            raise TooFewConformations(len(tables))
+        if len(labels) != len(tables):
+            raise ValueError(
+                f'{len(labels)} labels given for {len(tables)} conformations'
+            )
+
+        self.labels = np.asarray(labels, dtype=object)
+        self.reference = reference
+
+        # residues present in every conformation
+        in_all = np.ones(len(tables[0].ids), dtype=bool)
+        for table in tables[1:]:
+            in_all &= pd.Index(tables[0].ids).isin(table.ids)
+        self.table = PairwiseTable(
+            tables[0].ids[in_all], tables[0].residue_numbers[in_all], columns={}
+        )
+
+        others = np.array([i for i in range(len(tables)) if i != reference])
+        n_pairs = len(self.table)
+        self.distance_min = np.empty(n_pairs, dtype=np.float32)
+        self.distance_max = np.empty(n_pairs, dtype=np.float32)
+        self.argmin = np.empty(n_pairs, dtype=np.int32)
+        self.argmax = np.empty(n_pairs, dtype=np.int32)
+        self.distance_sd = np.empty(n_pairs, dtype=np.float32)
+        self.distance_reference = (
+            None if reference is None else np.empty(n_pairs, dtype=np.float32)
+        )
+
+        # positions of the ids of self.table in each table, None where they are the same
+        positions = [
+            None
+            if np.array_equal(table.ids, self.table.ids)
+            else pd.Index(table.ids).get_indexer(self.table.ids)
+            for table in tables
+        ]
+        for start in range(0, n_pairs, BLOCK_SIZE):
+            k = np.arange(start, min(start + BLOCK_SIZE, n_pairs))
+            stacked = np.stack(
+                [
+                    self._distances(table, table_positions, k)
+                    for table, table_positions in zip(tables, positions)
+                ]
+            )
+            compared = stacked[others]
+
+            lowest = compared.argmin(axis=0)
+            highest = compared.argmax(axis=0)
+            self.argmin[k] = others[lowest]
+            self.argmax[k] = others[highest]
+            self.distance_min[k] = np.take_along_axis(compared, lowest[None], 0)[0]
+            self.distance_max[k] = np.take_along_axis(compared, highest[None], 0)[0]
+            self.distance_sd[k] = stacked.std(axis=0)
+            if reference is not None:
+                self.distance_reference[k] = stacked[reference]
+
+    def _distances(
+        self, table: PairwiseTable, positions: np.ndarray, k: np.ndarray
+    ) -> np.ndarray:
+        """Distances in table of the pairs at condensed positions k of self.table."""
+        if positions is None:
+            return table['distance'][k]
+        i, j = condensed_pairs(len(self.table.ids), k)
+        return table.values('distance', positions[i], positions[j])
+
+    def ranked(
+        self, r0: float, by: str = 'delta_E_fret', top: int = 500
+    ) -> pd.DataFrame:
+        """The top residue pairs by the magnitude of one of RANKINGS. Conformation A
+        is the reference, or else the conformation where the pair is closest.
+        """
+        if by not in RANKINGS:
+            raise ValueError(f'Unknown ranking: {by}')
+
+        if self.reference is None:
+            conformation_a, conformation_b = self.argmin, self.argmax
+            distance_a, distance_b = self.distance_min, self.distance_max
+        else:
+            distance_a = self.distance_reference
+            if by == 'delta_E_fret':
+                e_fret_a = _calculate_e_fret(distance_a, r0)
+                change_min = _calculate_e_fret(self.distance_min, r0) - e_fret_a
+                change_max = _calculate_e_fret(self.distance_max, r0) - e_fret_a
+            else:
+                change_min = self.distance_min - distance_a
+                change_max = self.distance_max - distance_a
+            to_max = np.abs(change_max) >= np.abs(change_min)
+            conformation_a = np.full(len(distance_a), self.reference)
+            conformation_b = np.where(to_max, self.argmax, self.argmin)
+            distance_b = np.where(to_max, self.distance_max, self.distance_min)
+
+        e_fret_a = _calculate_e_fret(distance_a, r0)
+        e_fret_b = _calculate_e_fret(distance_b, r0)
+        columns = {
+            'delta_distance': distance_a - distance_b,
+            'delta_E_fret': e_fret_a - e_fret_b,
+            'distance_sd': self.distance_sd,
+        }
+
+        score = np.where(self.table.lower_triangle, np.abs(columns[by]), -1)
+        top = min(top, int(self.table.lower_triangle.sum()))
+        k = np.argpartition(-score, top - 1)[:top] if top else np.array([], int)
+        k = k[np.argsort(-score[k], kind='stable')]
+
+        i, j = condensed_pairs(len(self.table.ids), k)
+        return pd.DataFrame(
+            {
+                'id_1': self.table.ids[i],
+                'id_2': self.table.ids[j],
+                'conformation_a': self.labels[conformation_a[k]],
+                'conformation_b': self.labels[conformation_b[k]],
+                'distance_a': distance_a[k],
+                'distance_b': distance_b[k],
+                'delta_distance': columns['delta_distance'][k],
+                'E_fret_a': e_fret_a[k],
+                'E_fret_b': e_fret_b[k],
+                'delta_E_fret': columns['delta_E_fret'][k],
+                'distance_sd': self.distance_sd[k],
+            }
+        )
+
+
+def compare_conformations(
+    tables: list[PairwiseTable], labels: list[str], reference: int = None
+) -> ConformationComparison:
+    with metrics.stage('compare'):
+        return ConformationComparison(tables, labels, reference)
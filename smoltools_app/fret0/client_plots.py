@@ -0,0 +1,211 @@
+"""Fret0 charts that are recomputed in the browser.
+
+The R0 curves and the E_fret heatmap are closed-form functions of a few scalars (the
+distances, R0 and the delta_E_fret cutoff) over data the browser already has. Here
+these scalars are Vega-Lite params bound to inputs drawn under the chart, and the
+E_fret values and the cutoff are expression transforms, so changing them takes no
+round trip to the server. Enabled with SMOLTOOLS_CLIENT_CHARTS.
+"""
+import os
+
+import pandas as pd
+from smoltools.fret0.utils import lower_triangle, sort_table
+import smoltools.resources.colors as colors
+
+from common.widgets.vega import VegaLiteSpec, columnar_data_transformer
+
+CLIENT_CHARTS = bool(os.environ.get('SMOLTOOLS_CLIENT_CHARTS'))
+
+VEGA_LITE_SCHEMA = 'https://vega.github.io/schema/vega-lite/v5.json'
+
+# room left under a chart for the inputs of its params
+BINDINGS_HEIGHT = 60
+
+MAX_SIZE = 600
+
+
+def _e_fret(distance: str, r0: str) -> str:
+    """Vega expression of the E_fret at distance for R0."""
+    return f'1 / (1 + pow({distance} / {r0}, 6))'
+
+
+def _range_param(
+    name: str, value: float, title: str, start: float, end: float, step: float
+) -> dict:
+    return {
+        'name': name,
+        'value': value,
+        'bind': {
+            'input': 'range',
+            'min': start,
+            'max': end,
+            'step': step,
+            'name': f'{title} ',
+        },
+    }
+
+
+def r0_curves(distance_a: float, distance_b: float) -> VegaLiteSpec:
+    """fret0.plots.r0_curves, with the distances in the two conformations as inputs of
+    the chart. The curves are generated from the inputs in the browser, so no data is
+    sent.
+    """
+    nearest = {'param': 'nearest', 'empty': False}
+    x = {'field': 'r0', 'type': 'quantitative', 'title': 'R0 (\u212B)'}
+    y = {'field': 'e_fret', 'type': 'quantitative', 'title': 'E_fret'}
+    color = {
+        'field': 'distance',
+        'type': 'nominal',
+        'scale': {'domain': ['A', 'B'], 'range': [colors.RED, colors.BLUE]},
+        'legend': {'orient': 'bottom-right'},
+    }
+    by_distance = {'fold': ['A', 'B'], 'as': ['distance', 'e_fret']}
+
+    return VegaLiteSpec(
+        {
+            '$schema': VEGA_LITE_SCHEMA,
+            'width': 400,
+            'height': 300,
+            'params': [
+                _range_param(
+                    'distance_a', distance_a, 'Distance in A (\u212B)', 10, 100, 0.1
+                ),
+                _range_param(
+                    'distance_b', distance_b, 'Distance in B (\u212B)', 10, 100, 0.1
+                ),
+            ],
+            'data': {'sequence': {'start': 20, 'stop': 81, 'as': 'r0'}},
+            'transform': [
+                {'calculate': _e_fret('distance_a', 'datum.r0'), 'as': 'A'},
+                {'calculate': _e_fret('distance_b', 'datum.r0'), 'as': 'B'},
+                {'calculate': 'abs(datum.A - datum.B)', 'as': 'delta'},
+            ],
+            'layer': [
+                {
+                    'mark': {'type': 'area', 'interpolate': 'basis'},
+                    'encoding': {
+                        'x': x,
+                        'y': {'field': 'delta', 'type': 'quantitative'},
+                        'opacity': {'value': 0.3},
+                        'color': {'value': colors.LIGHT_GREY},
+                    },
+                },
+                {
+                    'transform': [by_distance],
+                    'mark': {'type': 'line', 'interpolate': 'basis'},
+                    'encoding': {'x': x, 'y': y, 'color': color},
+                },
+                {
+                    'transform': [by_distance],
+                    'params': [
+                        {
+                            'name': 'nearest',
+                            'select': {
+                                'type': 'point',
+                                'nearest': True,
+                                'on': 'mouseover',
+                                'fields': ['r0'],
+                            },
+                        }
+                    ],
+                    'mark': 'point',
+                    'encoding': {'x': x, 'opacity': {'value': 0}},
+                },
+                {
+                    'transform': [by_distance],
+                    'mark': {'type': 'circle', 'size': 50},
+                    'encoding': {
+                        'x': x,
+                        'y': y,
+                        'color': color,
+                        'opacity': {'condition': {**nearest, 'value': 1}, 'value': 0},
+                    },
+                },
+                {
+                    'transform': [by_distance, {'filter': nearest}],
+                    'mark': {'type': 'rule', 'color': 'gray'},
+                    'encoding': {'x': x},
+                },
+                {
+                    'transform': [
+                        by_distance,
+                        {'calculate': 'format(datum.e_fret, ".1%")', 'as': 'label'},
+                    ],
+                    'mark': {
+                        'type': 'text',
+                        'align': 'left',
+                        'dx': 10,
+                        'dy': 10,
+                        'fontWeight': 'bold',
+                    },
+                    'encoding': {
+                        'x': x,
+                        'y': y,
+                        'color': color,
+                        'text': {
+                            'condition': {
+                                **nearest,
+                                'field': 'label',
+                                'type': 'ordinal',
+                            },
+                            'value': '',
+                        },
+                    },
+                },
+            ],
+        }
+    )
+
+
+def delta_e_fret_map(df: pd.DataFrame, r0: float, cutoff: float) -> VegaLiteSpec:
+    """fret0.plots.delta_e_fret_map from the distances of the pairs, with R0 and the
+    delta_E_fret cutoff as inputs of the chart. Every pair is sent, and the E_fret and
+    cutoff are applied in the browser.
+    """
+    df = sort_table(df.loc[lower_triangle])[
+        ['id_1', 'id_2', 'distance_a', 'distance_b']
+    ]
+    size = min(MAX_SIZE, df.id_1.nunique() * 10)
+    axis = {'sort': None, 'axis': {'labels': False, 'ticks': False}}
+
+    return VegaLiteSpec(
+        {
+            '$schema': VEGA_LITE_SCHEMA,
+            'width': size,
+            'height': size,
+            'params': [
+                _range_param('r0', r0, 'R0 of FRET pair', 10, 100, 0.1),
+                _range_param('cutoff', cutoff, '\u0394E_fret cutoff', 0, 1, 0.01),
+            ],
+            'data': columnar_data_transformer(df),
+            'transform': [
+                {'calculate': _e_fret('datum.distance_a', 'r0'), 'as': 'E_fret_a'},
+                {'calculate': _e_fret('datum.distance_b', 'r0'), 'as': 'E_fret_b'},
+                {
+                    'calculate': 'datum.E_fret_a - datum.E_fret_b',
+                    'as': 'delta_E_fret',
+                },
+                {'filter': 'abs(datum.delta_E_fret) > cutoff'},
+            ],
+            'mark': 'rect',
+            'encoding': {
+                'x': {'field': 'id_1', 'type': 'nominal', 'title': 'Residue #', **axis},
+                'y': {'field': 'id_2', 'type': 'nominal', 'title': 'Residue #', **axis},
+                'color': {
+                    'field': 'delta_E_fret',
+                    'type': 'quantitative',
+                    'title': '\u0394E_fret',
+                    # diverging at 0, as the range of delta_E_fret changes with R0
+                    'scale': {'scheme': 'redblue', 'domainMid': 0},
+                },
+                'tooltip': [
+                    {'field': 'id_1', 'title': 'Residue #1'},
+                    {'field': 'id_2', 'title': 'Residue #2'},
+                    {'field': 'E_fret_a', 'title': 'Conformation A', 'format': '.2f'},
+                    {'field': 'E_fret_b', 'title': 'Conformation B', 'format': '.2f'},
+                    {'field': 'delta_E_fret', 'title': '\u0394E_fret', 'format': '.2f'},
+                ],
+            },
+        },
+        data=[df],
+    )
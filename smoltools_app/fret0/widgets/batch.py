@@ -0,0 +1,81 @@
+import panel as pn
+import panel.widgets as pnw
+
+from common.widgets import table
+from fret0.batch import ConformationComparison
+
+# see ConformationComparison.ranked
+RANKING_NAMES = {
+    '\u0394E_fret': 'delta_E_fret',
+    '\u0394Distance': 'delta_distance',
+    'Distance SD': 'distance_sd',
+}
+
+
+def make_ranking_table(
+    comparison: ConformationComparison, r0: float, by: str, top: int
+) -> pnw.Tabulator:
+    return table.data_table(
+        data=comparison.ranked(r0, by=by, top=top),
+        titles={
+            'id_1': 'Res #1',
+            'id_2': 'Res #2',
+            'conformation_a': 'A',
+            'conformation_b': 'B',
+            'distance_a': 'Distance in A (\u212B)',
+            'distance_b': 'Distance in B (\u212B)',
+            'delta_distance': '\u0394Distance (\u212B)',
+            'E_fret_a': 'E_fret in A',
+            'E_fret_b': 'E_fret in B',
+            'delta_E_fret': '\u0394E_fret',
+            'distance_sd': 'Distance SD (\u212B)',
+        },
+        formatters={
+            'distance_a': '0.0',
+            'distance_b': '0.0',
+            'delta_distance': '0.0',
+            'E_fret_a': '0.00',
+            'E_fret_b': '0.00',
+            'delta_E_fret': '0.00',
+            'distance_sd': '0.0',
+        },
+        height=600,
+        width=1100,
+    )
+
+
+def make_batch_widget(comparison: ConformationComparison) -> pn.Card:
+    r0_input = pnw.FloatInput(name='R0 of FRET pair', value=50, width=150)
+    ranking_input = pnw.Select(name='Rank by', options=RANKING_NAMES, width=150)
+    top_input = pnw.IntInput(name='Residue pairs', value=500, start=1, width=150)
+
+    ranking_table = make_ranking_table(
+        comparison, r0_input.value, ranking_input.value, top_input.value
+    )
+
+    def update(event=None) -> None:
+        # while an input is cleared
+        if r0_input.value is None or top_input.value is None:
+            return
+        ranking_table.value = comparison.ranked(
+            r0_input.value, by=ranking_input.value, top=top_input.value
+        )
+
+    for widget in [r0_input, ranking_input, top_input]:
+        widget.param.watch(update, 'value')
+
+    if comparison.reference is None:
+        compared = f'all pairs of {len(comparison.labels)} conformations'
+    else:
+        reference = comparison.labels[comparison.reference]
+        compared = f'{len(comparison.labels) - 1} conformations against {reference}'
+
+    return pn.Card(
+        pn.Row(f'Residue pairs that differ the most between {compared}.'),
+        pn.Row(r0_input, ranking_input, top_input, align='center'),
+        pn.FlexBox(ranking_table, min_width=1100, justify_content='center'),
+        width=1120,
+        height=800,
+        title='Discriminating residue pairs',
+        collapsible=False,
+    )
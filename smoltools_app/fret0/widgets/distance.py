@@ -1,14 +1,46 @@
+from functools import partial
+from typing import NamedTuple
+
 import pandas as pd
 import panel as pn
 import panel.widgets as pnw
 from smoltools import fret0
 
+from common import downsample
+from common.downsample import HeatmapData
+from common.pairwise import CutoffIndex, PairwiseTable
 from common.widgets import table
+from common.widgets.heatmap import Heatmap
+
+DEFAULT_CUTOFF = 20
+
+HEATMAP_PRIORITY = downsample.largest_change('delta_distance')
+
 
+class DistanceData(NamedTuple):
+    index: CutoffIndex
+    table: pd.DataFrame
+    heatmap: HeatmapData
+
+
+def distance_data(df: PairwiseTable, cutoff: float = DEFAULT_CUTOFF) -> DistanceData:
+    """The pairs indexed by delta_distance, and the table and heatmap shown at cutoff,
+    prepared in the worker so that make_distance_widget only builds the widgets.
+    """
+    # sorted once per upload, so a change of cutoff only takes a slice of the pairs
+    index = CutoffIndex(df, 'delta_distance')
+    return DistanceData(
+        index=index,
+        table=index.at_least(cutoff),
+        heatmap=downsample.prepare_heatmap(
+            index.magnitude_above(cutoff), HEATMAP_PRIORITY
+        ),
+    )
 
-def make_distance_table(df: pd.DataFrame, cutoff: float) -> pnw.DataFrame:
+
+def make_distance_table(df: pd.DataFrame) -> pnw.Tabulator:
     distance_table = table.data_table(
-        data=df.loc[lambda x: fret0.lower_triangle(x) & (x.delta_distance >= cutoff)],
+        data=df,
         titles={
             'id_1': 'Res #1',
             'id_2': 'Res #2',
@@ -27,26 +59,41 @@ def make_distance_table(df: pd.DataFrame, cutoff: float) -> pnw.DataFrame:
     return distance_table
 
 
-def make_distance_heatmap(df: pd.DataFrame, cutoff: float) -> pn.pane.Vega:
-    heatmap = fret0.plots.delta_distance_map(df, cutoff=cutoff)
-    return pn.pane.Vega(heatmap)
+def distance_heatmap_data(index: CutoffIndex, cutoff: float) -> dict:
+    return {
+        'data': index.magnitude_above(cutoff),
+        'plot': partial(fret0.plots.delta_distance_map, cutoff=cutoff),
+    }
 
 
-def make_distance_widget(df: pd.DataFrame):
-    delta_distance_input = pnw.FloatInput(
-        name='\u0394Distance cutoff (\u212B)', value=20
+def make_distance_heatmap(heatmap: HeatmapData, cutoff: float) -> Heatmap:
+    return Heatmap(
+        data=heatmap,
+        plot=partial(fret0.plots.delta_distance_map, cutoff=cutoff),
+        priority=HEATMAP_PRIORITY,
     )
 
-    distance_table = pn.bind(make_distance_table, df=df, cutoff=delta_distance_input)
-    distance_heatmap = pn.bind(
-        make_distance_heatmap, df=df, cutoff=delta_distance_input
+
+def make_distance_widget(data: DistanceData):
+    delta_distance_input = pnw.FloatInput(
+        name='\u0394Distance cutoff (\u212B)', value=DEFAULT_CUTOFF
     )
 
+    index = data.index
+    distance_table = make_distance_table(data.table)
+    distance_heatmap = make_distance_heatmap(data.heatmap, delta_distance_input.value)
+
+    # the table and heatmap are updated in place, sending only their new data
+    def update_cutoff(event) -> None:
+        distance_table.value = index.at_least(event.new)
+        distance_heatmap.update(**distance_heatmap_data(index, event.new))
+
+    delta_distance_input.param.watch(update_cutoff, 'value')
+
     controls = pn.Row(delta_distance_input, align='center')
     table = pn.FlexBox(distance_table, min_width=720, justify_content='center')
     heatmap = pn.FlexBox(distance_heatmap, min_width=720, justify_content='center')
 
-    # BUG: widgets shift around after first change to parameters
     return pn.Card(
         controls,
         pn.Tabs(
@@ -1,16 +1,95 @@
+from collections import OrderedDict
+from functools import partial
+from typing import Callable, NamedTuple
+
+import numpy as np
 import pandas as pd
 import panel as pn
 import panel.widgets as pnw
 from smoltools import fret0
 
+from common import downsample
+from common.downsample import HeatmapData
+from common.pairwise import CutoffIndex, PairwiseTable
 from common.widgets import table
+from common.widgets.heatmap import Heatmap
+from fret0 import client_plots
+from utils import metrics
+
+DEFAULT_R0 = 50
+DEFAULT_CUTOFF = 0.5
+# number of R0 values whose E_fret is kept
+MAX_CACHED_R0 = 8
+
+HEATMAP_PRIORITY = downsample.largest_change('delta_E_fret')
+# the R0 of the client-side heatmap is changed in the browser, so its binned blocks
+# are represented by a pair chosen independently of R0
+CLIENT_HEATMAP_PRIORITY = downsample.largest_change('delta_distance')
+
+
+def _calculate_e_fret(distance: np.ndarray, r0: float) -> np.ndarray:
+    return 1 / (1 + (distance / r0) ** 6)
+
+
+class EFretByR0:
+    """The E_fret of each residue pair in df for a given R0, computed and indexed by
+    delta_E_fret once per R0 and shared between the table and the heatmap. Unlike an
+    lru_cache, it can be prepared in a worker process and sent to the session.
+    """
+
+    def __init__(self, df: PairwiseTable):
+        self._df = df
+        self._cache: OrderedDict[float, CutoffIndex] = OrderedDict()
+
+    def __call__(self, r0: float) -> CutoffIndex:
+        if r0 in self._cache:
+            self._cache.move_to_end(r0)
+            return self._cache[r0]
+
+        with metrics.stage('e_fret'):
+            e_fret_a = _calculate_e_fret(self._df['distance_a'], r0)
+            e_fret_b = _calculate_e_fret(self._df['distance_b'], r0)
+            e_fret = self._df.with_columns(
+                {
+                    'E_fret_a': e_fret_a,
+                    'E_fret_b': e_fret_b,
+                    'delta_E_fret': e_fret_a - e_fret_b,
+                }
+            )
+            index = CutoffIndex(e_fret, 'delta_E_fret')
+
+        self._cache[r0] = index
+        if len(self._cache) > MAX_CACHED_R0:
+            self._cache.popitem(last=False)
+        return index
+
 
+class EFretData(NamedTuple):
+    e_fret_by_r0: EFretByR0
+    table: pd.DataFrame
+    heatmap: HeatmapData
 
-def make_e_fret_table(df: pd.DataFrame, r0: float, cutoff: float) -> pnw.DataFrame:
+
+def e_fret_data(
+    df: PairwiseTable, r0: float = DEFAULT_R0, cutoff: float = DEFAULT_CUTOFF
+) -> EFretData:
+    """The E_fret of the pairs at R0, and the table and heatmap shown at R0 and
+    cutoff, prepared in the worker so that make_e_fret_widget only builds the widgets.
+    """
+    e_fret_by_r0 = EFretByR0(df)
+    index = e_fret_by_r0(r0)
+    if client_plots.CLIENT_CHARTS:
+        heatmap = downsample.prepare_heatmap(df, CLIENT_HEATMAP_PRIORITY)
+    else:
+        heatmap = downsample.prepare_heatmap(
+            index.magnitude_above(cutoff), HEATMAP_PRIORITY
+        )
+    return EFretData(e_fret_by_r0, index.at_least(cutoff), heatmap)
+
+
+def make_e_fret_table(df: pd.DataFrame) -> pnw.Tabulator:
     e_fret_table = table.data_table(
-        data=fret0.e_fret_between_conformations(df, r0).loc[
-            lambda x: fret0.lower_triangle(x) & (x.delta_E_fret >= cutoff)
-        ],
+        data=df,
         titles={
             'id_1': 'Res #1',
             'id_2': 'Res #2',
@@ -29,39 +108,88 @@ def make_e_fret_table(df: pd.DataFrame, r0: float, cutoff: float) -> pnw.DataFra
     return e_fret_table
 
 
-def make_e_fret_heatmap(df: pd.DataFrame, r0: float, cutoff: float) -> pn.pane.Vega:
-    data = fret0.e_fret_between_conformations(df, r0)
-    heatmap = fret0.plots.delta_e_fret_map(data, cutoff=cutoff)
-    return pn.pane.Vega(heatmap)
+def e_fret_heatmap_data(
+    e_fret_by_r0: Callable[[float], CutoffIndex], r0: float, cutoff: float
+) -> dict:
+    # pre-filtering leaves the color scale unchanged, as the pair with the largest
+    # |delta_E_fret| always passes the cutoff
+    return {
+        'data': e_fret_by_r0(r0).magnitude_above(cutoff),
+        'plot': partial(fret0.plots.delta_e_fret_map, cutoff=cutoff),
+    }
 
 
-def make_e_fret_widget(df: pd.DataFrame) -> pn.Card:
-    r0_input = pnw.FloatInput(name='R0 of FRET pair', value=50)
-    delta_e_fret_cutoff_input = pnw.FloatSlider(
-        name='\u0394E_fret cutoff', start=0, end=1.0, value=0.5
+def make_e_fret_heatmap(heatmap: HeatmapData, cutoff: float) -> Heatmap:
+    return Heatmap(
+        data=heatmap,
+        plot=partial(fret0.plots.delta_e_fret_map, cutoff=cutoff),
+        priority=HEATMAP_PRIORITY,
     )
 
-    e_fret_table = pn.bind(
-        make_e_fret_table,
-        df=df,
-        r0=r0_input,
-        cutoff=delta_e_fret_cutoff_input,
+
+def make_client_e_fret_heatmap(
+    heatmap: HeatmapData, r0: float, cutoff: float
+) -> Heatmap:
+    """Heatmap of the distances of every pair, with R0 and the cutoff as inputs of the
+    chart, applied in the browser. Their values are not sent back to the server, so
+    zooming re-renders the chart with the inputs reset to the given R0 and cutoff.
+    Binned blocks are represented by their pair with the largest |delta_distance|.
+    """
+    return Heatmap(
+        data=heatmap,
+        plot=partial(client_plots.delta_e_fret_map, r0=r0, cutoff=cutoff),
+        priority=CLIENT_HEATMAP_PRIORITY,
     )
 
-    e_fret_heatmap = pn.bind(
-        make_e_fret_heatmap,
-        df=df,
-        r0=r0_input,
-        cutoff=delta_e_fret_cutoff_input,
+
+def make_e_fret_widget(data: EFretData) -> pn.Card:
+    r0_input = pnw.FloatInput(name='R0 of FRET pair', value=DEFAULT_R0)
+    delta_e_fret_cutoff_input = pnw.FloatSlider(
+        name='\u0394E_fret cutoff', start=0, end=1.0, value=DEFAULT_CUTOFF
     )
 
+    e_fret_by_r0 = data.e_fret_by_r0
+    e_fret_table = make_e_fret_table(data.table)
+    if client_plots.CLIENT_CHARTS:
+        e_fret_heatmap = make_client_e_fret_heatmap(
+            data.heatmap, r0_input.value, delta_e_fret_cutoff_input.value
+        )
+    else:
+        e_fret_heatmap = make_e_fret_heatmap(
+            data.heatmap, delta_e_fret_cutoff_input.value
+        )
+
+    # the table and heatmap are updated in place, sending only their new data
+    def update(event=None) -> None:
+        r0, cutoff = r0_input.value, delta_e_fret_cutoff_input.value
+        e_fret_table.value = e_fret_by_r0(r0).at_least(cutoff)
+        if not client_plots.CLIENT_CHARTS:
+            e_fret_heatmap.update(**e_fret_heatmap_data(e_fret_by_r0, r0, cutoff))
+
+    r0_input.param.watch(update, 'value')
+    delta_e_fret_cutoff_input.param.watch(update, 'value')
+
     controls = pn.Row(r0_input, delta_e_fret_cutoff_input, align='center')
     table = pn.FlexBox(e_fret_table, min_width=720, justify_content='center')
     heatmap = pn.FlexBox(e_fret_heatmap, min_width=720, justify_content='center')
 
-    # BUG: widgets shift around after first change to parameters
+    header = [controls]
+    if client_plots.CLIENT_CHARTS:
+        # the heatmap has inputs of its own, so the controls only apply to the table
+        table = pn.Column(controls, table)
+        heatmap = pn.Column(
+            pn.Row(
+                f'Zooming resets R0 to {DEFAULT_R0} and the \u0394E_fret cutoff to'
+                f' {DEFAULT_CUTOFF}.',
+                align='center',
+            ),
+            heatmap,
+            pn.Spacer(height=client_plots.BINDINGS_HEIGHT),
+        )
+        header = []
+
     return pn.Card(
-        controls,
+        *header,
         pn.Tabs(
             ('Table', table),
             ('Heatmap', heatmap),
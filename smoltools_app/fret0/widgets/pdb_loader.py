@@ -1,6 +1,10 @@
 import panel.widgets as pnw
 
-from common.widgets.pdb_loader import PDBLoader, ConformationInputWidget
+from common.widgets.pdb_loader import (
+    BatchInputWidget,
+    ConformationInputWidget,
+    PDBLoader,
+)
 
 
 def fret_pdb_loader() -> PDBLoader:
@@ -13,3 +17,15 @@ def fret_pdb_loader() -> PDBLoader:
         options_widget=options_widget,
         about=about,
     )
+
+
+def fret_batch_loader(input_widget: BatchInputWidget) -> PDBLoader:
+    about = """
+        Upload a multi-model structure or several structures to find the residue pairs that best discriminate between conformations.
+        """
+    options_widget = pnw.Checkbox(name='SASA loaded as b-factor')
+    return PDBLoader(
+        input_widget=input_widget,
+        options_widget=options_widget,
+        about=about,
+    )
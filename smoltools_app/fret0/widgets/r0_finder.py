@@ -3,6 +3,9 @@ import panel as pn
 import panel.widgets as pnw
 from smoltools import fret0
 
+from common.widgets.vega import ColumnarVega
+from fret0 import client_plots
+
 
 def r0_pair_table() -> pnw.DataFrame:
     fret_pair_table = pnw.DataFrame(
@@ -26,15 +29,35 @@ def r0_pair_table() -> pnw.DataFrame:
 
 
 # BUG: Selection triggering errors in console
-def make_chart(distance_a, distance_b) -> pn.pane.Vega:
+def make_chart(distance_a, distance_b) -> ColumnarVega:
     chart = fret0.plots.r0_curves(distance_a, distance_b)
 
-    return pn.pane.Vega(
+    return ColumnarVega(
         chart,
     )
 
 
+def make_client_widget() -> pn.Card:
+    """The R0 curves with the distances as inputs of the chart, replotted in the
+    browser.
+    """
+    chart = ColumnarVega(
+        client_plots.r0_curves(51.1, 29.7),
+        margin=(5, 10, client_plots.BINDINGS_HEIGHT, 10),
+    )
+
+    return pn.Card(
+        pn.Row(chart, align='center'),
+        pn.Row(r0_pair_table(), align='center'),
+        title='FRET pair finder',
+        collapsible=False,
+    )
+
+
 def make_widget() -> pn.Card:
+    if client_plots.CLIENT_CHARTS:
+        return make_client_widget()
+
     distance_a_input = pnw.FloatInput(
         name='Distance in A', start=10, end=100, value=51.1, width=120
     )
@@ -42,11 +65,16 @@ def make_widget() -> pn.Card:
         name='Distance in B', start=10, end=100, value=29.7, width=120
     )
 
-    chart = pn.bind(
-        make_chart,
-        distance_a=distance_a_input,
-        distance_b=distance_b_input,
-    )
+    chart = make_chart(distance_a_input.value, distance_b_input.value)
+
+    # replotted in place, sending only the new curves
+    def update(event=None) -> None:
+        chart.object = fret0.plots.r0_curves(
+            distance_a_input.value, distance_b_input.value
+        )
+
+    distance_a_input.param.watch(update, 'value')
+    distance_b_input.param.watch(update, 'value')
 
     table = r0_pair_table()
 
@@ -1,21 +1,67 @@
+import importlib
+import logging
 import os
+import threading
+from typing import Callable
 
 import panel as pn
 
-from noesy_neighbors.app import app as noesy_neighbors_app
-from fret0.app import app as fret0_app
-from rate_my_plate.app import app as rate_my_plate_app
 from utils import paths
+from utils.metrics import MetricsHandler
+
+APP_MODULES = {
+    'Fret0': 'fret0.app',
+    'NOESY_Neighbors': 'noesy_neighbors.app',
+    'Rate_My_Plate': 'rate_my_plate.app',
+}
+
+# number of server processes sharing the port, 0 for one per CPU core. Each process has
+# its own sessions, caches and worker pool. Heroku sets WEB_CONCURRENCY per dyno size.
+NUM_PROCS = int(
+    os.environ.get('SMOLTOOLS_NUM_PROCS', os.environ.get('WEB_CONCURRENCY', 1))
+)
+
+# serve the stage timings of finished runs at /metrics, in the Prometheus text format
+METRICS_ENDPOINT = bool(os.environ.get('SMOLTOOLS_METRICS'))
+
+# comma separated app names (or 'all') to import in the background once the server
+# is listening, so that their first session does not wait for the imports
+WARM_UP = os.environ.get('SMOLTOOLS_WARM_UP', '')
+
+
+def lazy_app(module: str) -> Callable[[], pn.viewable.Viewable]:
+    """App factory that imports the module of a tool, and with it Biopython, smoltools,
+    altair etc., only when its route is first requested.
+    """
+
+    def app() -> pn.viewable.Viewable:
+        return importlib.import_module(module).app()
+
+    return app
+
+
+def warm_up_modules(names: str) -> list[str]:
+    if names.strip().lower() == 'all':
+        return list(APP_MODULES.values())
+    return [APP_MODULES[name.strip()] for name in names.split(',') if name.strip()]
+
+
+def warm_up(modules: list[str]) -> None:
+    def _import_modules():
+        for module in modules:
+            importlib.import_module(module)
+
+    threading.Thread(target=_import_modules, name='warm-up', daemon=True).start()
 
 
 def main() -> None:
+    # log the timings of each run (utils.metrics), not the access log of every request
+    logging.basicConfig(format='%(asctime)s %(name)s %(levelname)s: %(message)s')
+    logging.getLogger('smoltools').setLevel(logging.INFO)
+
     INDEX = str(paths.SOURCE / 'index.html')
 
-    APPS = {
-        'Fret0': fret0_app,
-        'NOESY_Neighbors': noesy_neighbors_app,
-        'Rate_My_Plate': rate_my_plate_app,
-    }
+    APPS = {name: lazy_app(module) for name, module in APP_MODULES.items()}
 
     ON_HEROKU = os.environ.get('ON_HEROKU')
     if ON_HEROKU:
@@ -25,6 +71,8 @@ def main() -> None:
             'address': '0.0.0.0',
             'websocket_origin': f'{APP_NAME}.herokuapp.com',
             'port': PORT,
+            'num_procs': NUM_PROCS,
+            'show': False,
         }
     else:
         PORT = 5006
@@ -33,13 +81,26 @@ def main() -> None:
         server_config = {
             'port': PORT,
             'static_dirs': STATIC_DIRECTORIES,
+            'num_procs': NUM_PROCS,
+            # only open one browser tab, not one per process
+            'show': NUM_PROCS == 1,
         }
 
-    pn.serve(
+    if METRICS_ENDPOINT:
+        server_config['extra_patterns'] = [('/metrics', MetricsHandler)]
+
+    # the port is bound when the server is created, before any app is imported. With
+    # more than one process, the server forks here and the rest runs in every process.
+    server = pn.serve(
         APPS,
         index=INDEX,
+        start=False,
         **server_config,
     )
+    warm_up(warm_up_modules(WARM_UP))
+
+    server.start()
+    server.io_loop.start()
 
 
 if __name__ == '__main__':
@@ -1,16 +1,134 @@
+from functools import partial
+from pathlib import Path
+
 from Bio.PDB.Chain import Chain
 import pandas as pd
 import panel as pn
 from smoltools import noesy_neighbors
+from smoltools.noesy_neighbors.utils import extract_residue_number
 
+from common.chain_results import chain_result
+from common.pairwise import (
+    PairwiseSource,
+    PairwiseTable,
+    SparsePairwiseTable,
+    SparseRectangularPairwiseTable,
+)
+from common.structures import ChainSpec
+from noesy_neighbors import ensemble
 from noesy_neighbors.widgets import distance, noe_map, scatter
+from noesy_neighbors.widgets.pdb_loader import NOEOptions
+from utils import metrics
+
+# the interchain analyses only show NOEs, so only the pairs within NOE range are found
+# (with KD-trees) and stored. The conformation analyses also show the change in
+# distance of every pair, and store all pairs.
+NOE_CUTOFF = noe_map.MAX_NOE_DISTANCE
+
+
+def labeled_atom_distances(
+    chain: Chain, labeled_atoms: dict[str, list[str]], cutoff: float = None
+) -> tuple[pd.DataFrame, PairwiseTable | SparsePairwiseTable]:
+    """Coordinates of the labeled atoms of a chain and the distances between them, of
+    all pairs or only of the pairs at most cutoff apart.
+    """
+    with metrics.stage('distance'):
+        coords = noesy_neighbors.coordinates_from_chain(chain, labeled_atoms)
+        if cutoff is None:
+            distances = PairwiseTable.from_coordinates(coords, extract_residue_number)
+        else:
+            distances = SparsePairwiseTable.from_coordinates(
+                coords, extract_residue_number, cutoff
+            )
+        return coords, distances
+
+
+def ensemble_distances(
+    models: list[Chain], labeled_atoms: dict[str, list[str]], cutoff: float = None
+) -> tuple[ensemble.EnsembleCoordinates, PairwiseTable | SparsePairwiseTable]:
+    """Coordinates of the labeled atoms of a chain in every model, and the distances
+    between them averaged over the models.
+    """
+    with metrics.stage('distance'):
+        coords = ensemble.EnsembleCoordinates.from_models(models, labeled_atoms)
+        if cutoff is None:
+            distances = ensemble.ensemble_table(coords)
+        else:
+            distances = ensemble.sparse_ensemble_table(coords, cutoff)
+        return coords, distances
+
+
+def chain_distances(
+    spec: ChainSpec,
+    labeled_atoms: dict[str, list[str]],
+    cutoff: float = None,
+    ensemble: bool = False,
+) -> tuple[pd.DataFrame, PairwiseTable | SparsePairwiseTable]:
+    labels = tuple(
+        (residue, tuple(atoms)) for residue, atoms in sorted(labeled_atoms.items())
+    )
+    if ensemble:
+        return chain_result(
+            spec._replace(model=None),
+            analysis='noesy_neighbors_ensemble',
+            options=(labels, cutoff),
+            compute=partial(
+                ensemble_distances, labeled_atoms=labeled_atoms, cutoff=cutoff
+            ),
+            size=lambda result: result[0].nbytes + result[1].nbytes,
+            load=ChainSpec.models,
+        )
+    return chain_result(
+        spec,
+        analysis='noesy_neighbors',
+        options=(labels, cutoff),
+        compute=partial(
+            labeled_atom_distances, labeled_atoms=labeled_atoms, cutoff=cutoff
+        ),
+        size=lambda result: result[0].memory_usage(deep=True).sum() + result[1].nbytes,
+    )
 
 
 def run_interchain_analysis(
     chain_a: Chain, chain_b: Chain, labeled_atoms: dict[str, list[str]]
 ) -> list[pn.Card]:
     data = load_interchain_data(chain_a, chain_b, labeled_atoms)
-    return load_interchain_analyses(data)
+    return load_interchain_analyses(prepare_interchain_analyses(data))
+
+
+def _chain_id(spec: ChainSpec, options: NOEOptions) -> str:
+    if options.ensemble:
+        return f'{Path(spec.filename).stem}/all/{spec.chain}'
+    return spec.chain_id
+
+
+def run_interchain_pipeline(
+    spec_a: ChainSpec, spec_b: ChainSpec, options: NOEOptions
+) -> dict[str, PairwiseSource]:
+    coords_a, distances_a = chain_distances(
+        spec_a, options.labeled_atoms, NOE_CUTOFF, options.ensemble
+    )
+    coords_b, distances_b = chain_distances(
+        spec_b, options.labeled_atoms, NOE_CUTOFF, options.ensemble
+    )
+
+    with metrics.stage('distance'):
+        if options.ensemble:
+            delta_distances = ensemble.sparse_ensemble_interchain_table(
+                coords_a, coords_b, NOE_CUTOFF
+            )
+        else:
+            delta_distances = SparseRectangularPairwiseTable.from_coordinates(
+                coords_a, coords_b, NOE_CUTOFF
+            )
+
+    return {
+        'a': distances_a,
+        'b': distances_b,
+        'delta': delta_distances,
+        'chain_a_id': _chain_id(spec_a, options),
+        'chain_b_id': _chain_id(spec_b, options),
+    }
 
 
 def _get_chain_id(chain: Chain) -> str:
@@ -22,13 +140,14 @@ def _get_chain_id(chain: Chain) -> str:
 
 def load_interchain_data(
     chain_a: Chain, chain_b: Chain, labeled_atoms: dict[str, list[str]]
-) -> dict[str, pd.DataFrame]:
-    coords_a = noesy_neighbors.coordinates_from_chain(chain_a, labeled_atoms)
-    coords_b = noesy_neighbors.coordinates_from_chain(chain_b, labeled_atoms)
+) -> dict[str, PairwiseSource]:
+    coords_a, distances_a = labeled_atom_distances(chain_a, labeled_atoms, NOE_CUTOFF)
+    coords_b, distances_b = labeled_atom_distances(chain_b, labeled_atoms, NOE_CUTOFF)
 
-    distances_a = noesy_neighbors.pairwise_distances(coords_a)
-    distances_b = noesy_neighbors.pairwise_distances(coords_b)
-    delta_distances = noesy_neighbors.pairwise_distances(coords_a, coords_b)
+    with metrics.stage('distance'):
+        delta_distances = SparseRectangularPairwiseTable.from_coordinates(
+            coords_a, coords_b, NOE_CUTOFF
+        )
 
     return {
         'a': distances_a,
@@ -39,7 +158,23 @@ def load_interchain_data(
     }
 
 
-def load_interchain_analyses(data: dict[str, pd.DataFrame]) -> list[pn.Card]:
+def prepare_interchain_analyses(data: dict[str, PairwiseSource]) -> dict:
+    """data with the chart shown first by load_interchain_analyses prepared, in the
+    worker rather than on the event loop.
+    """
+    with metrics.stage('chart_data'):
+        return {**data, 'combined_noe_heatmap': noe_map.combined_noe_heatmap_data(data)}
+
+
+def run_interchain_dashboard_pipeline(
+    spec_a: ChainSpec, spec_b: ChainSpec, options: NOEOptions
+) -> dict:
+    return prepare_interchain_analyses(
+        run_interchain_pipeline(spec_a, spec_b, options)
+    )
+
+
+def load_interchain_analyses(data: dict) -> list[pn.Card]:
     return [
         noe_map.make_dimer_noe_widget(data),
     ]
@@ -49,22 +184,43 @@ def run_conformation_analysis(
     chain_a: Chain, chain_b: Chain, mode: str
 ) -> list[pn.Card]:
     data = load_conformation_data(chain_a, chain_b, mode)
-    return load_conformation_analyses(data)
+    return load_conformation_analyses(prepare_conformation_analyses(data))
 
 
-def load_conformation_data(
-    chain_a: Chain, chain_b: Chain, mode: str
-) -> dict[str, pd.DataFrame]:
-    distances_a = noesy_neighbors.coordinates_from_chain(chain_a, mode).pipe(
-        noesy_neighbors.pairwise_distances
+def run_conformation_pipeline(
+    spec_a: ChainSpec, spec_b: ChainSpec, options: NOEOptions
+) -> dict[str, PairwiseSource]:
+    _, distances_a = chain_distances(
+        spec_a, options.labeled_atoms, ensemble=options.ensemble
     )
-    distances_b = noesy_neighbors.coordinates_from_chain(chain_b, mode).pipe(
-        noesy_neighbors.pairwise_distances
+    _, distances_b = chain_distances(
+        spec_b, options.labeled_atoms, ensemble=options.ensemble
     )
 
-    delta_distances = noesy_neighbors.pairwise_distances_between_conformations(
-        distances_a, distances_b
-    )
+    with metrics.stage('distance'):
+        delta_distances = PairwiseTable.between_conformations(
+            distances_a, distances_b
+        )
+
+    return {
+        'a': distances_a,
+        'b': distances_b,
+        'delta': delta_distances,
+        'chain_a_id': _chain_id(spec_a, options),
+        'chain_b_id': _chain_id(spec_b, options),
+    }
+
+
+def load_conformation_data(
+    chain_a: Chain, chain_b: Chain, mode: str
+) -> dict[str, PairwiseSource]:
+    _, distances_a = labeled_atom_distances(chain_a, mode)
+    _, distances_b = labeled_atom_distances(chain_b, mode)
+
+    with metrics.stage('distance'):
+        delta_distances = PairwiseTable.between_conformations(
+            distances_a, distances_b
+        )
 
     return {
         'a': distances_a,
@@ -75,7 +231,28 @@ def load_conformation_data(
     }
 
 
-def load_conformation_analyses(data: dict[str, pd.DataFrame]) -> list[pn.Card]:
+def prepare_conformation_analyses(data: dict[str, PairwiseSource]) -> dict:
+    """data with the charts shown first by load_conformation_analyses prepared, in the
+    worker rather than on the event loop.
+    """
+    with metrics.stage('chart_data'):
+        return {
+            **data,
+            'delta_heatmap': distance.delta_distance_heatmap_data(data['delta']),
+            'combined_noe_heatmap': noe_map.combined_noe_heatmap_data(data),
+            'scatter': scatter.scatter_data(data['delta'], scatter.NOE_THRESHOLD),
+        }
+
+
+def run_conformation_dashboard_pipeline(
+    spec_a: ChainSpec, spec_b: ChainSpec, options: NOEOptions
+) -> dict:
+    return prepare_conformation_analyses(
+        run_conformation_pipeline(spec_a, spec_b, options)
+    )
+
+
+def load_conformation_analyses(data: dict) -> list[pn.Card]:
     return [
         distance.make_distance_widget(data),
         noe_map.make_monomer_noe_widget(data),
@@ -1,12 +1,18 @@
 from typing import Callable
 
 import panel as pn
-from smoltools.pdbtools.exceptions import ChainNotFound, NoResiduesFound, NoAtomsFound
 
-from noesy_neighbors.analysis import run_interchain_analysis, run_conformation_analysis
+from noesy_neighbors.analysis import (
+    run_interchain_dashboard_pipeline,
+    run_conformation_dashboard_pipeline,
+    load_interchain_analyses,
+    load_conformation_analyses,
+)
 from noesy_neighbors.widgets import pdb_loader
-from common.widgets.pdb_loader import NoFileSelected, PDBLoader
-from utils import colors, config
+from common.structures import INPUT_ERRORS
+from common.widgets.pdb_loader import PDBLoader
+from utils import colors, config, metrics
+from utils.executor import BackgroundTask
 
 
 class Dashboard(pn.template.BootstrapTemplate):
@@ -24,6 +30,8 @@ class Dashboard(pn.template.BootstrapTemplate):
         self.pdb_loader_2 = pdb_loader.nmr_subunit_loader()
         self.pdb_loader_2.bind_button(self.upload_interchain_files)
 
+        self._task = BackgroundTask('noesy_neighbors')
+
         self.main.append(
             pn.FlexBox(
                 pn.Row(
@@ -38,29 +46,47 @@ class Dashboard(pn.template.BootstrapTemplate):
             )
         )
 
-    def _upload_files(self, pdb_loader: PDBLoader, analysis_function: Callable):
-        try:
-            chain_a = pdb_loader.chain_a
-            chain_b = pdb_loader.chain_b
-            mode = pdb_loader.options_value
-
-            analyses = analysis_function(chain_a, chain_b, mode)
-        except (NoFileSelected, ChainNotFound, NoResiduesFound, NoAtomsFound) as e:
-            pdb_loader.show_error(e)
-        else:
+    def _upload_files(
+        self,
+        pdb_loader: PDBLoader,
+        pipeline: Callable,
+        analyses_function: Callable,
+    ):
+        def _upload_success(data: dict) -> None:
+            with metrics.stage('chart'):
+                analyses = analyses_function(data)
             pdb_loader.upload_success()
-            self.show_analyses(analyses)
+            with metrics.stage('render'):
+                self.show_analyses(analyses)
+
+        def _upload_error(error: Exception) -> None:
+            if isinstance(error, INPUT_ERRORS):
+                pdb_loader.show_error(error)
+            else:
+                pdb_loader.show_unexpected_error(error)
+
+        pdb_loader.show_busy()
+        self._task.submit(
+            pipeline,
+            pdb_loader.chain_a_spec,
+            pdb_loader.chain_b_spec,
+            pdb_loader.options_value,
+            on_success=_upload_success,
+            on_error=_upload_error,
+        )
 
     def upload_conformation_files(self, event=None) -> Callable:
         self._upload_files(
             pdb_loader=self.pdb_loader_1,
-            analysis_function=run_conformation_analysis,
+            pipeline=run_conformation_dashboard_pipeline,
+            analyses_function=load_conformation_analyses,
         )
 
     def upload_interchain_files(self, event=None) -> Callable:
         self._upload_files(
             pdb_loader=self.pdb_loader_2,
-            analysis_function=run_interchain_analysis,
+            pipeline=run_interchain_dashboard_pipeline,
+            analyses_function=load_interchain_analyses,
         )
 
     def show_analyses(self, analyses: list[pn.Card]) -> None:
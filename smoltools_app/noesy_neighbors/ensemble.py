@@ -0,0 +1,158 @@
+"""NOE distances averaged over the models of an NMR ensemble.
+
+The coordinates of the labeled atoms found in every model are stacked into a
+(models x atoms x 3) array. The distance of a pair is the r^-6 average over the models,
+<r^-6>^(-1/6), which weighs the models where the atoms are close the most, as NOE
+intensities do. distance_sd is the standard deviation of the distance over the models.
+"""
+from Bio.PDB.Chain import Chain
+import numpy as np
+from scipy.spatial import cKDTree
+import scipy.spatial.distance as ssd
+from smoltools import noesy_neighbors
+from smoltools.noesy_neighbors.utils import extract_residue_number
+
+from common.pairwise import (
+    PairwiseTable,
+    SparsePairwiseTable,
+    SparseRectangularPairwiseTable,
+)
+
+
+class EnsembleCoordinates:
+    def __init__(self, ids: np.ndarray, residue_numbers: np.ndarray, xyz: np.ndarray):
+        self.ids = ids
+        self.residue_numbers = residue_numbers
+        self.xyz = xyz
+
+    @classmethod
+    def from_models(
+        cls, models: list[Chain], labeled_atoms: dict[str, list[str]]
+    ) -> 'EnsembleCoordinates':
+        """Labeled atoms present in every model, ordered by residue number."""
+        tables = [
+            noesy_neighbors.coordinates_from_chain(chain, labeled_atoms)
+            for chain in models
+        ]
+        ids = tables[0].index
+        for table in tables[1:]:
+            ids = ids[ids.isin(table.index)]
+
+        numbers = extract_residue_number(ids.to_series()).to_numpy()
+        order = np.argsort(numbers, kind='stable')
+        ids = ids[order]
+        xyz = np.stack(
+            [
+                table.to_numpy(dtype=np.float64)[table.index.get_indexer(ids)]
+                for table in tables
+            ]
+        )
+        return cls(ids.to_numpy(dtype=object), numbers[order], xyz)
+
+    @property
+    def nbytes(self) -> int:
+        return self.xyz.nbytes
+
+
+def _average(distances: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """r^-6 averages and standard deviations over the first axis (models)."""
+    with np.errstate(divide='ignore'):
+        average = np.mean(distances**-6.0, axis=0) ** (-1 / 6)
+    return average, distances.std(axis=0)
+
+
+def _pair_keys(pairs: np.ndarray, n: int) -> np.ndarray:
+    return pairs[:, 0].astype(np.int64) * n + pairs[:, 1]
+
+
+def ensemble_table(coords: EnsembleCoordinates) -> PairwiseTable:
+    """Averaged distances of all the pairs. The sums are accumulated a model at a time,
+    so memory does not grow with the number of models.
+    """
+    inverse_sixth = 0
+    total = 0
+    total_squares = 0
+    for xyz in coords.xyz:
+        distance = ssd.pdist(xyz)
+        with np.errstate(divide='ignore'):
+            inverse_sixth = inverse_sixth + distance**-6.0
+        total = total + distance
+        total_squares = total_squares + distance**2
+
+    n_models = len(coords.xyz)
+    mean = total / n_models
+    variance = np.maximum(total_squares / n_models - mean**2, 0)
+    return PairwiseTable(
+        ids=coords.ids,
+        residue_numbers=coords.residue_numbers,
+        columns={
+            'distance': (inverse_sixth / n_models) ** (-1 / 6),
+            'distance_sd': np.sqrt(variance),
+        },
+    )
+
+
+def sparse_ensemble_table(
+    coords: EnsembleCoordinates, cutoff: float
+) -> SparsePairwiseTable:
+    """Averaged distances of the pairs at most cutoff apart. The average is no shorter
+    than the shortest distance over the models, so these are among the pairs within
+    cutoff in at least one model.
+    """
+    n = len(coords.ids)
+    candidates = np.unique(
+        np.concatenate(
+            [
+                _pair_keys(cKDTree(xyz).query_pairs(cutoff, output_type='ndarray'), n)
+                for xyz in coords.xyz
+            ]
+        )
+    )
+    position_1, position_2 = candidates // n, candidates % n
+    distances = np.linalg.norm(
+        coords.xyz[:, position_1] - coords.xyz[:, position_2], axis=2
+    )
+    average, sd = _average(distances)
+    within = average <= cutoff
+    return SparsePairwiseTable(
+        ids=coords.ids,
+        residue_numbers=coords.residue_numbers,
+        position_1=position_1[within],
+        position_2=position_2[within],
+        distance=average[within],
+        cutoff=cutoff,
+        extra_columns={'distance_sd': sd[within]},
+    )
+
+
+def sparse_ensemble_interchain_table(
+    coords_a: EnsembleCoordinates, coords_b: EnsembleCoordinates, cutoff: float
+) -> SparseRectangularPairwiseTable:
+    """Averaged distances between the atoms of two chains at most cutoff apart, over
+    the models of both (which must be the same models).
+    """
+    if len(coords_a.xyz) != len(coords_b.xyz):
+        raise ValueError('The chains must come from the same models')
+
+    n = len(coords_b.ids)
+    pairs = []
+    for xyz_a, xyz_b in zip(coords_a.xyz, coords_b.xyz):
+        found = cKDTree(xyz_a).sparse_distance_matrix(
+            cKDTree(xyz_b), cutoff, output_type='ndarray'
+        )
+        pairs.append(found['i'].astype(np.int64) * n + found['j'])
+    candidates = np.unique(np.concatenate(pairs))
+    rows, columns = candidates // n, candidates % n
+
+    distances = np.linalg.norm(coords_a.xyz[:, rows] - coords_b.xyz[:, columns], axis=2)
+    average, sd = _average(distances)
+    within = average <= cutoff
+    return SparseRectangularPairwiseTable(
+        ids_a=coords_a.ids,
+        ids_b=coords_b.ids,
+        rows=rows[within],
+        columns=columns[within],
+        distance=average[within],
+        cutoff=cutoff,
+        extra_columns={'distance_sd': sd[within]},
+    )
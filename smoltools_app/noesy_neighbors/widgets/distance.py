@@ -1,17 +1,24 @@
-import pandas as pd
 import panel as pn
 import panel.widgets as pnw
 from smoltools import noesy_neighbors
 
+from common import downsample
+from common.downsample import HeatmapData
+from common.pairwise import PairwiseTable
 from common.widgets import table
-from common.widgets.containers import centered_row
+from common.widgets.heatmap import Heatmap
+from common.widgets.tabs import lazy_tabs
 
+DELTA_DISTANCE_PRIORITY = downsample.largest_change('delta_distance')
 
-def make_distance_table(df: pd.DataFrame) -> pnw.DataFrame:
+
+def delta_distance_heatmap_data(df: PairwiseTable) -> HeatmapData:
+    return downsample.prepare_heatmap(df, DELTA_DISTANCE_PRIORITY)
+
+
+def make_distance_table(df: PairwiseTable) -> pnw.Tabulator:
     return table.data_table(
-        data=df.loc[
-            lambda x: noesy_neighbors.lower_triangle(x) & (x.delta_distance > 0)
-        ],
+        data=df.to_frame(df.lower_triangle & (df['delta_distance'] > 0)),
         titles={
             'id_1': 'Atom #1',
             'id_2': 'Atom #2',
@@ -27,21 +34,29 @@ def make_distance_table(df: pd.DataFrame) -> pnw.DataFrame:
     )
 
 
-def make_distance_widget(data: dict[str, pd.DataFrame]):
-    distance_table = make_distance_table(data['delta'])
+def make_distance_widget(data: dict[str, PairwiseTable | HeatmapData]):
+    """data as prepared by analysis.prepare_conformation_analyses."""
 
-    distance_map_a = pn.pane.Vega(noesy_neighbors.plots.distance_map(data['a']))
-    distance_map_b = pn.pane.Vega(noesy_neighbors.plots.distance_map(data['b']))
-    delta_distance_map = pn.pane.Vega(
-        noesy_neighbors.plots.delta_distance_map(data['delta'])
-    )
+    def distance_map(df: PairwiseTable) -> Heatmap:
+        return Heatmap(
+            df,
+            plot=noesy_neighbors.plots.distance_map,
+            priority=downsample.shortest_distance,
+        )
+
+    def delta_distance_map() -> Heatmap:
+        return Heatmap(
+            data['delta_heatmap'],
+            plot=noesy_neighbors.plots.delta_distance_map,
+            priority=DELTA_DISTANCE_PRIORITY,
+        )
 
     return pn.Card(
-        pn.Tabs(
-            ('\u0394Distance', centered_row(delta_distance_map)),
-            ('Conformation A', centered_row(distance_map_a)),
-            ('Conformation B', centered_row(distance_map_b)),
-            ('Table', centered_row(distance_table)),
+        lazy_tabs(
+            ('\u0394Distance', delta_distance_map),
+            ('Conformation A', lambda: distance_map(data['a'])),
+            ('Conformation B', lambda: distance_map(data['b'])),
+            ('Table', lambda: make_distance_table(data['delta'])),
             align='center',
         ),
         title='Pairwise Distances',
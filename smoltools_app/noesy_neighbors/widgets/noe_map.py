@@ -1,38 +1,69 @@
+from collections import defaultdict
+from functools import partial
+from typing import Callable
+
+import numpy as np
 import pandas as pd
 import panel as pn
+from panel.viewable import Viewer
 import panel.widgets as pnw
-import param
 
 from smoltools import noesy_neighbors
 
+from common import downsample
+from common.downsample import HeatmapData
+from common.pairwise import (
+    PairwiseSource,
+    PairwiseTable,
+    RectangularPairwiseTable,
+    SparsePairwiseTable,
+    SparseRectangularPairwiseTable,
+    SplicedPairwiseTable,
+)
 from common.widgets import table
-from common.widgets.containers import centered_row
+from common.widgets.heatmap import Heatmap
+from common.widgets.tabs import lazy_tabs
+from utils import scheduling
+
+# wait for a pause in typing (ms) before searching the NOE table
+SEARCH_DEBOUNCE_TIME = 300
+# upper bound of the weakest NOE bin of noesy_neighbors.add_noe_bins (angstroms)
+MAX_NOE_DISTANCE = 10
+
+
+def noe_heatmap(
+    df: PairwiseSource | HeatmapData, plot: Callable = noesy_neighbors.plots.noe_map
+) -> Heatmap:
+    return Heatmap(df, plot=plot, priority=downsample.shortest_distance)
 
 
-def make_monomer_noe_widget(data: dict[str, pd.DataFrame]) -> pn.Card:
-    combined_distances = noesy_neighbors.splice_conformation_tables(
+def combined_noe_heatmap_data(data: dict[str, PairwiseSource]) -> HeatmapData:
+    """Heatmap of the distances in chain or conformation A below the diagonal, and in
+    B above it.
+    """
+    combined_distances = SplicedPairwiseTable(
         data['a'],
         data['b'],
         chain_a_id=data['chain_a_id'],
         chain_b_id=data['chain_b_id'],
     )
+    return downsample.prepare_heatmap(combined_distances, downsample.shortest_distance)
 
-    noe_map_a = pn.pane.Vega(noesy_neighbors.plots.noe_map(data['a']))
-    noe_map_b = pn.pane.Vega(noesy_neighbors.plots.noe_map(data['b']))
-    combined_noe_map = pn.pane.Vega(
-        noesy_neighbors.plots.spliced_noe_map(combined_distances)
-    )
 
-    chain_a_table_data = filter_table_data(data['a'], symmetric=True)
-    chain_b_table_data = filter_table_data(data['b'], symmetric=True)
+def combined_noe_map(heatmap: HeatmapData) -> Heatmap:
+    return noe_heatmap(heatmap, plot=noesy_neighbors.plots.spliced_noe_map)
+
+
+def make_monomer_noe_widget(data: dict[str, PairwiseSource | HeatmapData]) -> pn.Card:
+    """data as prepared by analysis.prepare_conformation_analyses."""
 
     return pn.Card(
-        pn.Tabs(
-            ('Combined', centered_row(combined_noe_map)),
-            ('Conformation A', centered_row(noe_map_a)),
-            ('Conformation B', centered_row(noe_map_b)),
-            ('NOE table A', centered_row(NOETable(chain_a_table_data).view)),
-            ('NOE table B', centered_row(NOETable(chain_b_table_data).view)),
+        lazy_tabs(
+            ('Combined', lambda: combined_noe_map(data['combined_noe_heatmap'])),
+            ('Conformation A', lambda: noe_heatmap(data['a'])),
+            ('Conformation B', lambda: noe_heatmap(data['b'])),
+            ('NOE table A', lambda: noe_table(data['a'], symmetric=True)),
+            ('NOE table B', lambda: noe_table(data['b'], symmetric=True)),
         ),
         title='NOE Maps',
         collapsible=False,
@@ -40,40 +71,31 @@ def make_monomer_noe_widget(data: dict[str, pd.DataFrame]) -> pn.Card:
     )
 
 
-def make_dimer_noe_widget(data: dict[str, pd.DataFrame]) -> pn.Card:
-    combined_distances = noesy_neighbors.splice_conformation_tables(
-        data['a'],
-        data['b'],
-        chain_a_id=data['chain_a_id'],
-        chain_b_id=data['chain_b_id'],
-    )
-    intra_chain_noe_map = pn.pane.Vega(
-        noesy_neighbors.plots.spliced_noe_map(combined_distances)
-    )
-    chain_a_noe_map = pn.pane.Vega(noesy_neighbors.plots.noe_map(data['a']))
-    chain_b_noe_map = pn.pane.Vega(noesy_neighbors.plots.noe_map(data['b']))
+def make_dimer_noe_widget(data: dict[str, PairwiseSource | HeatmapData]) -> pn.Card:
+    """data as prepared by analysis.prepare_interchain_analyses."""
 
-    inter_chain_noe_map = pn.pane.Vega(
-        noesy_neighbors.plots.interchain_noe_map(
+    def inter_chain_noe_map() -> Heatmap:
+        return noe_heatmap(
             data['delta'],
-            x_title=data['chain_a_id'],
-            y_title=data['chain_b_id'],
+            plot=partial(
+                noesy_neighbors.plots.interchain_noe_map,
+                x_title=data['chain_a_id'],
+                y_title=data['chain_b_id'],
+            ),
         )
-    )
-
-    chain_a_table_data = filter_table_data(data['a'], symmetric=True)
-    chain_b_table_data = filter_table_data(data['b'], symmetric=True)
-    delta_table_data = filter_table_data(data['delta'], symmetric=False)
 
     return pn.FlexBox(
-        pn.Tabs(
-            ('Intra-chain NOEs', centered_row(intra_chain_noe_map)),
-            ('Chain A NOEs', centered_row(chain_a_noe_map)),
-            ('Chain B NOEs', centered_row(chain_b_noe_map)),
-            ('Inter-chain NOEs', centered_row(inter_chain_noe_map)),
-            ('NOE table A', centered_row(NOETable(chain_a_table_data).view)),
-            ('NOE table B', centered_row(NOETable(chain_b_table_data).view)),
-            ('NOE table A-B', centered_row(NOETable(delta_table_data).view)),
+        lazy_tabs(
+            (
+                'Intra-chain NOEs',
+                lambda: combined_noe_map(data['combined_noe_heatmap']),
+            ),
+            ('Chain A NOEs', lambda: noe_heatmap(data['a'])),
+            ('Chain B NOEs', lambda: noe_heatmap(data['b'])),
+            ('Inter-chain NOEs', inter_chain_noe_map),
+            ('NOE table A', lambda: noe_table(data['a'], symmetric=True)),
+            ('NOE table B', lambda: noe_table(data['b'], symmetric=True)),
+            ('NOE table A-B', lambda: noe_table(data['delta'], symmetric=False)),
             align='center',
             width=800,
         ),
@@ -82,60 +104,125 @@ def make_dimer_noe_widget(data: dict[str, pd.DataFrame]) -> pn.Card:
     )
 
 
-def filter_table_data(df: pd.DataFrame, symmetric: bool) -> pd.DataFrame:
-    data = (
-        df.pipe(noesy_neighbors.add_noe_bins)
-        .loc[
-            lambda x: x.noe_strength != 'none',
-            ['id_1', 'id_2', 'distance', 'noe_strength'],
-        ]
-        .sort_values('noe_strength')
-    )
+def noe_table(df: PairwiseSource, symmetric: bool) -> 'NOETable':
+    return NOETable(filter_table_data(df, symmetric=symmetric))
+
+
+def filter_table_data(
+    df: (
+        PairwiseTable
+        | RectangularPairwiseTable
+        | SparsePairwiseTable
+        | SparseRectangularPairwiseTable
+    ),
+    symmetric: bool,
+) -> pd.DataFrame:
+    within_range = df['distance'] <= MAX_NOE_DISTANCE
     if symmetric:
-        return data.loc[lambda x: noesy_neighbors.lower_triangle(x)]
-    else:
-        return data
+        within_range &= df.lower_triangle
 
+    frame = df.to_frame(within_range).pipe(noesy_neighbors.add_noe_bins)
+    # with the spread over the models of an ensemble, if any
+    columns = ['id_1', 'id_2', 'distance', 'distance_sd', 'noe_strength']
+    return frame.loc[
+        lambda x: x.noe_strength != 'none',
+        [column for column in columns if column in frame],
+    ].sort_values('noe_strength')
 
-def make_noe_table(df: pd.DataFrame) -> pnw.DataFrame:
+
+def make_noe_table(df: pd.DataFrame) -> pnw.Tabulator:
     return table.data_table(
         data=df,
         titles={
             'id_1': 'Atom #1',
             'id_2': 'Atom #2',
             'distance': 'Distance (\u212B)',
+            'distance_sd': 'Distance SD (\u212B)',
             'noe_strength': 'NOE',
         },
         formatters={
             'distance': '0.0',
+            'distance_sd': '0.0',
         },
     )
 
 
-class NOETable(param.Parameterized):
+class AtomIdIndex:
+    """Trigram index from substrings of atom ids to the rows of a pairwise table that
+    contain a matching atom id.
+    """
+
+    def __init__(self, id_1: pd.Series, id_2: pd.Series) -> None:
+        ids = pd.Index(pd.unique(np.concatenate([id_1.to_numpy(), id_2.to_numpy()])))
+        self._ids = ids.to_numpy(dtype=str)
+        self._codes_1 = ids.get_indexer(id_1)
+        self._codes_2 = ids.get_indexer(id_2)
+
+        self._trigrams: dict[str, set[int]] = defaultdict(set)
+        for code, atom_id in enumerate(self._ids):
+            for trigram in _trigrams(atom_id):
+                self._trigrams[trigram].add(code)
+
+    def matching_ids(self, term: str) -> list[int]:
+        candidates = set.intersection(
+            *(self._trigrams.get(trigram, set()) for trigram in _trigrams(term))
+        )
+        return [code for code in candidates if term in self._ids[code]]
+
+    def rows(self, term: str) -> np.ndarray:
+        matches = np.zeros(len(self._ids), dtype=bool)
+        matches[self.matching_ids(term)] = True
+        return matches[self._codes_1] | matches[self._codes_2]
+
+
+def _trigrams(value: str) -> list[str]:
+    return [value[i : i + 3] for i in range(len(value) - 2)]
+
+
+class NOETable(Viewer):
     def __init__(self, data: pd.DataFrame, **params) -> None:
         super().__init__(**params)
+        # converted once, so that the frames of every search keep the dtypes the
+        # header filters of the table work with
+        data = table.as_strings(data)
         self._data = data
+        self._index = AtomIdIndex(data.id_1, data.id_2)
         self._search_bar = pnw.TextInput(
             placeholder='Search for atom id...',
         )
+        self._table = make_noe_table(data)
+
+        self._current_term = None
+        self._pending_search = None
+        self._search_bar.param.watch(self._schedule_search, 'value_input')
+        self._search_bar.param.watch(self._search, 'value')
 
     @property
     def search_term(self) -> str:
-        value = self._search_bar.value.upper()
+        value = (self._search_bar.value_input or '').upper()
         return value if len(value) >= 3 else None
 
-    @pn.depends('_search_bar.value')
-    def view(self):
-        if self.search_term is None:
-            df = self._data
+    def _schedule_search(self, event=None) -> None:
+        scheduling.cancel(self._pending_search)
+        self._pending_search = scheduling.call_later(
+            self._search, delay=SEARCH_DEBOUNCE_TIME
+        )
+        if self._pending_search is None:
+            self._search()
+
+    def _search(self, event=None) -> None:
+        scheduling.cancel(self._pending_search)
+        if self.search_term == self._current_term:
+            return
+
+        self._current_term = self.search_term
+        if self._current_term is None:
+            self._table.value = self._data
         else:
-            df = self._data.loc[
-                lambda x: x.id_1.str.contains(self.search_term)
-                | x.id_2.str.contains(self.search_term)
-            ]
+            self._table.value = self._data.loc[self._index.rows(self._current_term)]
 
+    def __panel__(self) -> pn.Column:
         return pn.Column(
             self._search_bar,
-            make_noe_table(df),
+            self._table,
         )
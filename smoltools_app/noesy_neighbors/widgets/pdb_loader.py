@@ -1,3 +1,5 @@
+from typing import NamedTuple
+
 import panel as pn
 import panel.widgets as pnw
 from panel.viewable import Viewer
@@ -12,7 +14,7 @@ from common.widgets.pdb_loader import (
 
 def _nmr_pdb_loader(input_widget: PDBInputWidget, about: str) -> PDBLoader:
     return PDBLoader(
-        input_widget=input_widget, options_widget=LabeledAtomSelector(), about=about
+        input_widget=input_widget, options_widget=NOEOptionsWidget(), about=about
     )
 
 
@@ -68,6 +70,33 @@ class LabeledAtomSelector(Viewer):
         return {key: value for key, value in values.items() if value}
 
 
+class NOEOptions(NamedTuple):
+    labeled_atoms: dict[str, list[str]]
+    # average the distances over every model instead of reading one model
+    ensemble: bool = False
+
+
+class NOEOptionsWidget(Viewer):
+    def __init__(self, **params):
+        super().__init__(**params)
+        self._labeled_atoms = LabeledAtomSelector()
+        self._ensemble = pnw.Checkbox(
+            name='Average over all models (r\u207B\u2076, ignores Model)', value=False
+        )
+
+    def __panel__(self):
+        return pn.Column(
+            self._labeled_atoms,
+            pn.Row(self._ensemble, height=30),
+        )
+
+    @property
+    def value(self) -> NOEOptions:
+        return NOEOptions(
+            labeled_atoms=self._labeled_atoms.value, ensemble=self._ensemble.value
+        )
+
+
 def atom_checkbox(options: list[str], default: list[str] = None) -> pnw.CheckBoxGroup:
     if default is None:
         default = []
@@ -1,14 +1,34 @@
+import numpy as np
 import pandas as pd
 import panel as pn
 
 from smoltools import noesy_neighbors
 
+from common.pairwise import PairwiseTable
 from common.widgets.containers import centered_row
+from common.widgets.vega import ColumnarVega
 
+NOE_THRESHOLD = 15
 
-def make_distance_scatter_widget(data: dict[str, pd.DataFrame]):
-    distance_scatter = pn.pane.Vega(
-        noesy_neighbors.plots.distance_scatter(data['delta'], noe_threshold=15)
+
+def scatter_data(df: PairwiseTable, noe_threshold: float) -> pd.DataFrame:
+    """Pairs within the NOE threshold in either conformation. The pair with the largest
+    |delta_distance| is always included, as it sets the color scale of the plot.
+    """
+    within_threshold = (df['distance_a'] < noe_threshold) | (
+        df['distance_b'] < noe_threshold
+    )
+    if len(df):
+        within_threshold[np.abs(df['delta_distance']).argmax()] = True
+    return df.to_frame(within_threshold)
+
+
+def make_distance_scatter_widget(data: dict[str, PairwiseTable | pd.DataFrame]):
+    """data as prepared by analysis.prepare_conformation_analyses."""
+    distance_scatter = ColumnarVega(
+        noesy_neighbors.plots.distance_scatter(
+            data['scatter'], noe_threshold=NOE_THRESHOLD
+        )
     )
     return pn.Card(
         centered_row(distance_scatter),
@@ -1,20 +1,44 @@
 from io import BytesIO
+import logging
 from pathlib import Path
-import time
+from typing import Callable
 
 import altair as alt
+import pandas as pd
 import panel as pn
 import panel.widgets as pnw
 
-from utils import colors, config
+from common.widgets.pdb_loader import UNEXPECTED_ERROR_MESSAGE, busy_spinner
+from common.widgets.vega import ColumnarVega
+from utils import colors, config, metrics
+from utils.executor import BackgroundTask
 from rate_my_plate.widgets.excel_loader import (
     ExcelLoader,
     NoFileSelected,
     BadFileFormat,
 )
-from smoltools.rate_my_plate import read_data_from_bytes, rate_plate, convert_to_wide
+from rate_my_plate.export import PlateExport, render_export
+from rate_my_plate.fitting import rate_plate
+from rate_my_plate.reader import read_plate
 from smoltools.rate_my_plate import consumption_curve, kinetics_curves
-from rate_my_plate.widgets.excel_download import excel_file_download
+from rate_my_plate.widgets.excel_download import (
+    excel_file_download,
+    export_format_input,
+)
+
+logger = logging.getLogger('smoltools.errors')
+
+
+def load_plate(
+    filename: str, byte_file: bytes, on_progress: Callable[[int, int], None] = None
+) -> pd.DataFrame:
+    with metrics.stage('parse'):
+        return read_plate(filename, byte_file, on_progress=on_progress)
+
+
+def analyze_plate(data: pd.DataFrame, **params) -> pd.DataFrame:
+    with metrics.stage('fit'):
+        return rate_plate(data, **params)
 
 
 class Dashboard(pn.template.BootstrapTemplate):
@@ -45,6 +69,16 @@ class Dashboard(pn.template.BootstrapTemplate):
         self._continue_button.on_click(self.analyze_data)
 
         self._analysis_status = pnw.StaticText()
+        self._analysis_spinner = busy_spinner()
+
+        self._task = BackgroundTask('rate_my_plate')
+
+        # files are rendered in the background once the results are shown
+        self._export: PlateExport = None
+        self._export_task = BackgroundTask('rate_my_plate')
+        self._export_format = export_format_input()
+        self._export_format.param.watch(self._prepare_export, 'value')
+        self._download = excel_file_download(self._download_callback, 'rated.xlsx')
 
         self.main.append(
             pn.FlexBox(
@@ -57,16 +91,28 @@ class Dashboard(pn.template.BootstrapTemplate):
         )
 
     def load_excel_file(self, event=None) -> None:
-        try:
-            byte_file = self.excel_loader.input_value
-            self.data = read_data_from_bytes(byte_file)
-        except (ValueError, TypeError, AttributeError):
+        self.excel_loader.show_busy()
+        self._task.submit(
+            load_plate,
+            self.excel_loader.input_filename,
+            self.excel_loader.input_value,
+            on_success=self._load_success,
+            on_error=self._load_error,
+            on_progress=self.excel_loader.show_progress,
+        )
+
+    def _load_success(self, data: pd.DataFrame) -> None:
+        self.data = data
+        self.excel_loader.upload_success()
+        self.preview_data()
+
+    def _load_error(self, error: Exception) -> None:
+        if isinstance(error, (ValueError, TypeError, AttributeError)):
             self.excel_loader.show_error(NoFileSelected())
-        except KeyError:
+        elif isinstance(error, KeyError):
             self.excel_loader.show_error(BadFileFormat())
         else:
-            self.excel_loader.upload_success()
-            self.preview_data()
+            self.excel_loader.show_unexpected_error(error)
 
     def plot_consumption_curves(self) -> alt.Chart():
         return consumption_curve(
@@ -76,11 +122,16 @@ class Dashboard(pn.template.BootstrapTemplate):
         )
 
     def preview_data(self, event=None) -> None:
-        plots = self.plot_consumption_curves()
+        with metrics.stage('chart'):
+            plots = self.plot_consumption_curves()
+        with metrics.stage('render'):
+            self._show_preview(plots)
+
+    def _show_preview(self, plots: alt.Chart) -> None:
         self.main[0].objects = [
             pn.FlexBox(
                 pn.Column(
-                    pn.pane.Vega(plots),
+                    ColumnarVega(plots),
                     pn.Row(
                         self._lower_percent,
                         self._upper_percent,
@@ -95,7 +146,7 @@ class Dashboard(pn.template.BootstrapTemplate):
                         ),
                     ),
                     pn.layout.Divider(),
-                    self._continue_button,
+                    pn.Row(self._continue_button, self._analysis_spinner),
                     self._analysis_status,
                 ),
                 justify_content='center',
@@ -103,48 +154,90 @@ class Dashboard(pn.template.BootstrapTemplate):
         ]
 
     def analyze_data(self, event=None) -> None:
-        try:
-            if self._protein_concentration.value <= 0:
-                raise ValueError
-
-            self.analyzed_data = rate_plate(
-                self.data,
-                lower_percent=self._lower_percent.value,
-                upper_percent=self._upper_percent.value,
-                concentration=self._protein_concentration.value,
-            )
-        except ValueError:
+        if self._protein_concentration.value <= 0:
+            self._task.cancel()
+            self.show_concentration_error()
+            return
+
+        self._analysis_spinner.value = True
+        self._analysis_status.value = 'Running...'
+        self._task.submit(
+            analyze_plate,
+            self.data,
+            lower_percent=self._lower_percent.value,
+            upper_percent=self._upper_percent.value,
+            concentration=self._protein_concentration.value,
+            on_success=self._analysis_done,
+            on_error=self._analysis_error,
+        )
+
+    def _analysis_error(self, error: Exception) -> None:
+        if isinstance(error, ValueError):
             self.show_concentration_error()
         else:
-            self.analysis_success()
-            filename = Path(self.excel_loader.input_filename).stem
-            self.main[0].objects = [
-                pn.FlexBox(
-                    pn.Column(
-                        pn.pane.Vega(kinetics_curves(self.analyzed_data)),
-                        excel_file_download(
-                            self._download_callback,
-                            f'{filename}-rated.xlsx',
-                        ),
-                    ),
-                    justify_content='center',
+            logger.error('Unexpected error analysing a plate', exc_info=error)
+            self.show_analysis_error(UNEXPECTED_ERROR_MESSAGE)
+
+    def _analysis_done(self, analyzed_data: pd.DataFrame) -> None:
+        self.analyzed_data = analyzed_data
+        self._export = PlateExport(analyzed_data)
+        self.analysis_success()
+        with metrics.stage('chart'):
+            plots = kinetics_curves(self.analyzed_data)
+        with metrics.stage('render'):
+            self._show_results(plots)
+        self._prepare_export()
+
+    def _show_results(self, plots: alt.Chart) -> None:
+        self.main[0].objects = [
+            pn.FlexBox(
+                pn.Column(
+                    ColumnarVega(plots),
+                    pn.Row(self._export_format, self._download, align='end'),
                 ),
-            ]
+                justify_content='center',
+            ),
+        ]
+
+    def _prepare_export(self, event=None) -> None:
+        """Render the file in the selected format, unless it already is, in the
+        background.
+        """
+        file_format = self._export_format.value
+        filename = Path(self.excel_loader.input_filename).stem
+        self._download.filename = f'{filename}-rated.{file_format}'
+
+        export = self._export
+        if export is None or file_format in export:
+            return
+        self._export_task.submit(
+            render_export,
+            export.analyzed_data,
+            file_format,
+            on_success=lambda data: export.put(file_format, data),
+            on_error=self._export_error,
+        )
+
+    @staticmethod
+    def _export_error(error: Exception) -> None:
+        # rendered again, and reported, when the file is downloaded
+        pass
 
     def show_concentration_error(self) -> None:
+        self.show_analysis_error('Protein concentration must be > 0 uM')
+
+    def show_analysis_error(self, message: str) -> None:
+        self._analysis_spinner.value = False
         self._continue_button.button_type = 'warning'
-        self._analysis_status.value = 'Protein concentration must be > 0 uM'
+        self._analysis_status.value = message
 
     def analysis_success(self) -> None:
+        self._analysis_spinner.value = False
         self._analysis_status.value = 'Success!'
         self._continue_button.button_type = 'success'
-        time.sleep(0.5)
 
     def _download_callback(self) -> BytesIO:
-        bytes_io = BytesIO()
-        self.analyzed_data.pipe(convert_to_wide).to_excel(bytes_io, index=False)
-        bytes_io.seek(0)
-        return bytes_io
+        return BytesIO(self._export.get(self._export_format.value))
 
 
 def app() -> pn.pane:
@@ -0,0 +1,75 @@
+"""Files of the rates of an analyzed plate, in the wide layout of convert_to_wide (a row
+per plate column, a column per plate row).
+
+Each file is rendered once per analysis result and kept by PlateExport, so repeated
+downloads send the same bytes. Parquet requires pyarrow, which is optional.
+"""
+from io import BytesIO
+import threading
+
+from openpyxl import Workbook
+import pandas as pd
+
+from smoltools.rate_my_plate import convert_to_wide
+from utils import metrics
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    PARQUET_AVAILABLE = False
+else:
+    PARQUET_AVAILABLE = True
+
+FORMATS = {
+    'Excel (.xlsx)': 'xlsx',
+    'CSV (.csv)': 'csv',
+    **({'Parquet (.parquet)': 'parquet'} if PARQUET_AVAILABLE else {}),
+}
+
+
+def _write_xlsx(wide: pd.DataFrame) -> bytes:
+    # write-only workbooks stream rows to a temporary file instead of keeping cells
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([str(name) for name in wide.columns])
+    for row in wide.astype(object).where(wide.notna(), None).itertuples(index=False):
+        sheet.append(row)
+    bytes_io = BytesIO()
+    workbook.save(bytes_io)
+    return bytes_io.getvalue()
+
+
+def render_export(analyzed_data: pd.DataFrame, file_format: str) -> bytes:
+    with metrics.stage('export'):
+        wide = convert_to_wide(analyzed_data)
+        if file_format == 'xlsx':
+            return _write_xlsx(wide)
+        if file_format == 'csv':
+            return wide.to_csv(index=False).encode()
+        if file_format == 'parquet':
+            return wide.to_parquet(index=False)
+        raise ValueError(f'Unknown export format: {file_format}')
+
+
+class PlateExport:
+    """The exported files of one analysis result, rendered on first use."""
+
+    def __init__(self, analyzed_data: pd.DataFrame):
+        self.analyzed_data = analyzed_data
+        self._files: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, file_format: str) -> bool:
+        return file_format in self._files
+
+    def put(self, file_format: str, data: bytes) -> None:
+        with self._lock:
+            self._files.setdefault(file_format, data)
+
+    def get(self, file_format: str) -> bytes:
+        with self._lock:
+            data = self._files.get(file_format)
+        if data is None:
+            self.put(file_format, render_export(self.analyzed_data, file_format))
+            data = self._files[file_format]
+        return data
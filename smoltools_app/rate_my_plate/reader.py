@@ -0,0 +1,98 @@
+"""Reading of plate reader exports, a few hundred time points at a time.
+
+The table starts on the second row: a 'Kinetic read' column of times followed by a
+column of absorbances per well (see the example in the loader). Excel workbooks are
+streamed with openpyxl in read-only mode, and CSV exports of the same table are read in
+chunks with pandas. The result is the same tidy table as read_data_from_bytes.
+"""
+from io import BytesIO
+import os
+from pathlib import Path
+from typing import Callable, Iterator
+from zipfile import BadZipFile
+
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+import pandas as pd
+
+from smoltools.rate_my_plate import read_data_from_bytes
+from smoltools.rate_my_plate.main import clean_import
+
+# time points parsed at a time, between progress reports
+CHUNK_ROWS = int(os.environ.get('SMOLTOOLS_PLATE_CHUNK_ROWS', 500))
+
+HEADER_ROW = 2
+
+
+def _xlsx_chunks(byte_file: bytes) -> Iterator[tuple[pd.DataFrame, int]]:
+    try:
+        workbook = load_workbook(BytesIO(byte_file), read_only=True, data_only=True)
+    except (BadZipFile, InvalidFileException) as e:
+        # as read_excel does for files that are not workbooks
+        raise ValueError(f'Not an Excel workbook: {e}') from None
+
+    try:
+        sheet = workbook.worksheets[0]
+        # from the dimension recorded in the file, if any
+        total = None if sheet.max_row is None else sheet.max_row - HEADER_ROW
+        rows = sheet.iter_rows(min_row=HEADER_ROW, values_only=True)
+
+        header = list(next(rows, ()))
+        while header and header[-1] is None:
+            header.pop()
+        columns = [i for i, name in enumerate(header) if name is not None]
+        names = [header[i] for i in columns]
+
+        chunk = []
+        empty = True
+        for row in rows:
+            # the table ends at the first row without a time
+            if not row or row[0] is None:
+                break
+            chunk.append([row[i] if i < len(row) else None for i in columns])
+            if len(chunk) == CHUNK_ROWS:
+                yield pd.DataFrame(chunk, columns=names), total
+                chunk, empty = [], False
+        if chunk or empty:
+            yield pd.DataFrame(chunk, columns=names), total
+    finally:
+        workbook.close()
+
+
+def _csv_chunks(byte_file: bytes) -> Iterator[tuple[pd.DataFrame, int]]:
+    total = byte_file.count(b'\n') - HEADER_ROW
+    reader = pd.read_csv(BytesIO(byte_file), skiprows=1, chunksize=CHUNK_ROWS)
+    with reader:
+        for chunk in reader:
+            yield chunk, total
+
+
+def read_plate(
+    filename: str,
+    byte_file: bytes,
+    on_progress: Callable[[int, int], None] = None,
+) -> pd.DataFrame:
+    """Tidy table of the NADH consumed in each well over time. on_progress is called
+    with the number of time points read so far and the total, if known.
+    """
+    if byte_file is None:
+        raise ValueError('No file selected')
+
+    suffix = Path(filename or '').suffix.lower()
+    if suffix == '.csv':
+        chunks = _csv_chunks(byte_file)
+    elif suffix == '.xls':
+        # legacy workbooks can not be streamed
+        return read_data_from_bytes(byte_file)
+    else:
+        chunks = _xlsx_chunks(byte_file)
+
+    frames = []
+    done = 0
+    for chunk, total in chunks:
+        frames.append(chunk)
+        done += len(chunk)
+        if on_progress is not None:
+            on_progress(done, total)
+
+    return pd.concat(frames, ignore_index=True).pipe(clean_import)
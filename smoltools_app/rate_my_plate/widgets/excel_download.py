@@ -2,6 +2,8 @@ from typing import Callable
 
 import panel.widgets as pnw
 
+from rate_my_plate.export import FORMATS
+
 
 def excel_file_download(callback: Callable, filename: str) -> pnw.FileDownload:
     return pnw.FileDownload(
@@ -11,3 +13,7 @@ def excel_file_download(callback: Callable, filename: str) -> pnw.FileDownload:
         button_type='primary',
         label='Download analyzed data',
     )
+
+
+def export_format_input() -> pnw.Select:
+    return pnw.Select(name='File format', options=FORMATS, width=150)
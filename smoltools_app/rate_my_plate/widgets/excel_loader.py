@@ -1,14 +1,20 @@
+import logging
 from typing import Callable
 
 import panel as pn
 from panel.viewable import Viewer
 import panel.widgets as pnw
-import time
+
+from common.widgets.pdb_loader import UNEXPECTED_ERROR_MESSAGE, busy_spinner
+from utils import scheduling
+from utils.scheduling import SUCCESS_DISPLAY_TIME
+
+logger = logging.getLogger('smoltools.errors')
 
 
 class NoFileSelected(Exception):
     def __init__(self):
-        message = 'Please select Excel file'
+        message = 'Please select an Excel or CSV file'
         super().__init__(message)
 
 
@@ -19,7 +25,7 @@ class BadFileFormat(Exception):
 
 
 def excel_file_input() -> pnw.FileInput:
-    return pnw.FileInput(accept='.xls,.xlsx')
+    return pnw.FileInput(accept='.xls,.xlsx,.csv')
 
 
 class ExcelLoader(Viewer):
@@ -32,19 +38,43 @@ class ExcelLoader(Viewer):
 
         self._button = pnw.Button(name='Upload', button_type='primary', width=150)
         self._status = pnw.StaticText()
+        self._spinner = busy_spinner()
+        self._reset_callback = None
         self._example = pn.pane.PNG('assets/screenshots/atpase_example.png')
 
     def bind_button(self, function: Callable[..., None]) -> None:
         self._button.on_click(function)
 
+    def show_busy(self) -> None:
+        scheduling.cancel(self._reset_callback)
+        self._spinner.value = True
+        self._status.value = 'Loading...'
+
     def show_error(self, error: Exception) -> None:
+        scheduling.cancel(self._reset_callback)
+        self._spinner.value = False
         self._button.button_type = 'warning'
         self._status.value = f'Error: {error.args[0]}'
 
+    def show_unexpected_error(self, error: Exception) -> None:
+        """Logs an error that is not the user's to fix, and shows a generic message."""
+        logger.error('Unexpected error loading a plate', exc_info=error)
+        self.show_error(Exception(UNEXPECTED_ERROR_MESSAGE))
+
+    def show_progress(self, done: int, total: int = None) -> None:
+        read = f'{done}' if total is None else f'{done}/{total}'
+        self._status.value = f'Loading... {read} time points read'
+
     def upload_success(self) -> None:
+        self._spinner.value = False
         self._status.value = 'Success!'
         self._button.button_type = 'success'
-        time.sleep(0.5)
+        self._reset_callback = scheduling.call_later(
+            self._reset_button, delay=SUCCESS_DISPLAY_TIME
+        )
+
+    def _reset_button(self) -> None:
+        self._button.button_type = 'primary'
 
     @property
     def input_value(self):
@@ -57,7 +87,7 @@ class ExcelLoader(Viewer):
     def __panel__(self) -> pn.panel:
         return pn.Card(
             self._input_widget,
-            pn.Row(self._button, align='center'),
+            pn.Row(self._button, self._spinner, align='center'),
             pn.Row(self._status, align='center'),
             'Example data format:',
             pn.Row(self._example, align='center'),
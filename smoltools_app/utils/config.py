@@ -13,5 +13,7 @@ def configure_panel_extensions():
 
 
 def configure_plotting_libraries():
+    # ColumnarVega panes send their chart data as typed arrays instead, see
+    # common.widgets.vega
     alt.data_transformers.enable('default')
     alt.data_transformers.disable_max_rows()
@@ -0,0 +1,296 @@
+"""Shared worker pool for running analysis pipelines off the Tornado event loop."""
+from concurrent.futures import (
+    Executor,
+    Future,
+    InvalidStateError,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from functools import partial
+import os
+import threading
+import traceback
+from typing import Any, Callable, Iterable
+
+import panel as pn
+from panel.io.state import set_curdoc
+
+from utils import metrics
+
+# 'thread' or 'process'; a process pool requires picklable arguments and results
+EXECUTOR_KIND = os.environ.get('SMOLTOOLS_EXECUTOR', 'thread')
+MAX_WORKERS = int(os.environ.get('SMOLTOOLS_WORKERS', 0)) or None
+
+_executor: Executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> Executor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if EXECUTOR_KIND == 'process':
+                _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+            elif EXECUTOR_KIND == 'thread':
+                _executor = ThreadPoolExecutor(
+                    max_workers=MAX_WORKERS, thread_name_prefix='smoltools'
+                )
+            else:
+                raise ValueError(f'Unknown executor kind: {EXECUTOR_KIND}')
+    return _executor
+
+
+class WorkerTraceback(Exception):
+    """Traceback of an exception raised in a worker, set as the cause of the restored
+    exception so that it is logged with it.
+    """
+
+    def __str__(self) -> str:
+        return self.args[0]
+
+
+class WorkerError(Exception):
+    """Carries an exception raised in a worker back to the session. Exceptions with
+    custom constructors (e.g. ChainNotFound) can not be unpickled directly.
+    """
+
+    def __init__(self, error_type: type, args: tuple, traceback: str = ''):
+        super().__init__(error_type, args, traceback)
+        self.error_type = error_type
+        self.error_args = args
+        self.traceback = traceback
+
+    def restore(self) -> Exception:
+        error = self.error_type.__new__(self.error_type)
+        error.args = self.error_args
+        if self.traceback:
+            error.__cause__ = WorkerTraceback(f'\n"""\n{self.traceback}"""')
+        return error
+
+
+def _call(function: Callable, *args, **kwargs) -> tuple[Any, metrics.Run]:
+    run = metrics.Run()
+    try:
+        with metrics.recording(run):
+            result = function(*args, **kwargs)
+    except Exception as e:
+        raise WorkerError(type(e), e.args, traceback.format_exc()) from None
+    return result, run
+
+
+def _gather(
+    futures: list[Future], on_progress: Callable[[int], None] = None
+) -> Future:
+    """Future of the results of futures of _call, in order, and of their merged runs.
+    Fails with the first error, cancelling the remaining futures, and cancelling it
+    cancels them all. on_progress is called with the number of futures done so far.
+    """
+    gathered = Future()
+    lock = threading.Lock()
+    done = []
+
+    def _cancel_all() -> None:
+        for other in futures:
+            other.cancel()
+
+    def _one_done(future: Future) -> None:
+        if future.cancelled():
+            return
+        try:
+            if future.exception() is not None:
+                _cancel_all()
+                gathered.set_exception(future.exception())
+                return
+            with lock:
+                done.append(future)
+                count = len(done)
+            if on_progress is not None:
+                on_progress(count)
+            if count == len(futures):
+                run = metrics.Run()
+                results = []
+                for other in futures:
+                    result, worker_run = other.result()
+                    results.append(result)
+                    run.merge(worker_run)
+                gathered.set_result((results, run))
+        except InvalidStateError:
+            # already failed or cancelled
+            pass
+
+    def _on_cancel(future: Future) -> None:
+        if future.cancelled():
+            _cancel_all()
+
+    gathered.add_done_callback(_on_cancel)
+    for future in futures:
+        future.add_done_callback(_one_done)
+    if not futures:
+        gathered.set_result(([], metrics.Run()))
+    return gathered
+
+
+class BackgroundTask:
+    """Runs one pipeline at a time for a session on the shared worker pool.
+
+    Submitting a new run cancels the previous one, and the callbacks are invoked on
+    the session's event loop. Outside of a server session the function is run
+    synchronously. Errors raised by the function or by on_success are passed to
+    on_error. The stages timed in the function and in on_success are reported as
+    one metrics.Run, labelled with the name of the task and the function.
+    """
+
+    def __init__(self, name: str = None):
+        self.name = name
+        self._future: Future = None
+
+    @property
+    def busy(self) -> bool:
+        return self._future is not None
+
+    def submit(
+        self,
+        function: Callable,
+        *args,
+        on_success: Callable[[Any], None],
+        on_error: Callable[[Exception], None],
+        on_progress: Callable[[int, int], None] = None,
+        **kwargs,
+    ) -> None:
+        """on_progress, if given, is passed on to function as its on_progress keyword
+        argument, and called on the session's event loop with the progress function
+        reports (e.g. rows done and the total). Functions run in a process pool can
+        not report progress, and get on_progress=None.
+        """
+        self.cancel()
+        run = metrics.Run(
+            app=self.name,
+            pipeline=getattr(function, '__name__', None),
+            session=metrics.session_id(),
+        )
+
+        doc = pn.state.curdoc
+        if doc is None or doc.session_context is None:
+            if on_progress is not None:
+                kwargs['on_progress'] = on_progress
+            try:
+                with metrics.recording(run):
+                    result = function(*args, **kwargs)
+            except Exception as e:
+                on_error(e)
+            else:
+                self._succeed(run, on_success, on_error, result)
+            return
+
+        def _progress(*progress) -> None:
+            def _show_progress() -> None:
+                # not for runs that have been replaced since
+                if self._future is future:
+                    on_progress(*progress)
+
+            doc.add_next_tick_callback(_show_progress)
+
+        if on_progress is not None:
+            kwargs['on_progress'] = None if EXECUTOR_KIND == 'process' else _progress
+        future = get_executor().submit(_call, function, *args, **kwargs)
+        self._future = future
+        future.add_done_callback(
+            lambda f: doc.add_next_tick_callback(
+                partial(self._finish, doc, f, run, on_success, on_error)
+            )
+        )
+
+    def map(
+        self,
+        function: Callable,
+        items: Iterable[tuple],
+        *,
+        on_success: Callable[[list], None],
+        on_error: Callable[[Exception], None],
+        on_progress: Callable[[int, int], None] = None,
+    ) -> None:
+        """Like submit, but runs function(*args) for every args in items in parallel
+        on the worker pool, and calls on_success with the list of results in order.
+        on_progress is called with the number of items done and the total.
+        """
+        self.cancel()
+        items = list(items)
+        run = metrics.Run(
+            app=self.name,
+            pipeline=getattr(function, '__name__', None),
+            session=metrics.session_id(),
+        )
+
+        doc = pn.state.curdoc
+        if doc is None or doc.session_context is None:
+            try:
+                with metrics.recording(run):
+                    results = [function(*args) for args in items]
+            except Exception as e:
+                on_error(e)
+            else:
+                self._succeed(run, on_success, on_error, results)
+            return
+
+        def _progress(count: int) -> None:
+            def _show_progress() -> None:
+                # not for runs that have been replaced since
+                if self._future is future:
+                    on_progress(count, len(items))
+
+            if on_progress is not None:
+                doc.add_next_tick_callback(_show_progress)
+
+        executor = get_executor()
+        future = _gather(
+            [executor.submit(_call, function, *args) for args in items], _progress
+        )
+        self._future = future
+        future.add_done_callback(
+            lambda f: doc.add_next_tick_callback(
+                partial(self._finish, doc, f, run, on_success, on_error)
+            )
+        )
+
+    def cancel(self) -> None:
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+
+    def _finish(
+        self,
+        doc,
+        future: Future,
+        run: metrics.Run,
+        on_success: Callable[[Any], None],
+        on_error: Callable[[Exception], None],
+    ) -> None:
+        if future is not self._future or future.cancelled():
+            return
+        self._future = None
+
+        with set_curdoc(doc):
+            try:
+                result, worker_run = future.result()
+            except WorkerError as e:
+                on_error(e.restore())
+            except Exception as e:
+                on_error(e)
+            else:
+                run.merge(worker_run)
+                self._succeed(run, on_success, on_error, result)
+
+    @staticmethod
+    def _succeed(
+        run: metrics.Run,
+        on_success: Callable[[Any], None],
+        on_error: Callable[[Exception], None],
+        result: Any,
+    ) -> None:
+        try:
+            with metrics.recording(run):
+                on_success(result)
+        except Exception as e:
+            on_error(e)
+            return
+        run.report()
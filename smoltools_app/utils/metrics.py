@@ -0,0 +1,153 @@
+"""Per-run timings of the stages of an analysis (parse, distance, chart, render, ...)
+and the size of the data sent to the browser.
+
+Code being timed uses the stage context manager and add_size. These only record while a
+Run is active (see recording), which BackgroundTask sets up for every submitted pipeline
+and its callbacks. Stages can be nested, in which case the time of the inner stage is
+also counted in the outer one. Finished runs are logged and aggregated per process for
+the /metrics endpoint.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import threading
+import time
+
+import panel as pn
+from tornado.web import RequestHandler
+
+logger = logging.getLogger('smoltools.metrics')
+
+_current_run: ContextVar['Run'] = ContextVar('smoltools_run', default=None)
+
+
+class Run:
+    def __init__(self, app: str = None, pipeline: str = None, session: str = None):
+        self.app = app
+        self.pipeline = pipeline
+        self.session = session
+        self.timings: dict[str, float] = defaultdict(float)
+        self.sizes: dict[str, int] = defaultdict(int)
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.timings[stage] += seconds
+
+    def add_size(self, name: str, size: int) -> None:
+        self.sizes[name] += size
+
+    def merge(self, other: 'Run') -> None:
+        for stage, seconds in other.timings.items():
+            self.add_time(stage, seconds)
+        for name, size in other.sizes.items():
+            self.add_size(name, size)
+
+    def summary(self) -> str:
+        timings = ' '.join(f'{stage}={t:.3f}s' for stage, t in self.timings.items())
+        sizes = ' '.join(f'{name}={n / 1e3:.1f}kB' for name, n in self.sizes.items())
+        return f'{self.app} {self.pipeline} [{self.session}]: {timings} {sizes}'.strip()
+
+    def report(self) -> None:
+        logger.info(self.summary())
+        METRICS.record(self)
+
+
+@contextmanager
+def recording(run: Run):
+    """Record stages and sizes into run for the duration of the block."""
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    run = _current_run.get()
+    if run is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        run.add_time(name, time.perf_counter() - start)
+
+
+def add_size(name: str, size: int) -> None:
+    run = _current_run.get()
+    if run is not None:
+        run.add_size(name, size)
+
+
+def session_id() -> str:
+    doc = pn.state.curdoc
+    if doc is None or doc.session_context is None:
+        return None
+    return doc.session_context.id
+
+
+class Metrics:
+    """Process-wide totals of the stage timings and sizes of finished runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs: dict[tuple, int] = defaultdict(int)
+        self._timings: dict[tuple, list[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+        self._sizes: dict[tuple, list[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+
+    def record(self, run: Run) -> None:
+        with self._lock:
+            self._runs[(run.app, run.pipeline)] += 1
+            for stage, seconds in run.timings.items():
+                _observe(self._timings[(run.app, run.pipeline, stage)], seconds)
+            for name, size in run.sizes.items():
+                _observe(self._sizes[(run.app, run.pipeline, name)], size)
+
+    def exposition(self) -> str:
+        """Metrics in the Prometheus text format."""
+        with self._lock:
+            lines = ['# TYPE smoltools_runs_total counter']
+            for (app, pipeline), count in self._runs.items():
+                lines.append(f'smoltools_runs_total{_labels(app, pipeline)} {count}')
+
+            for metric, label, values in [
+                ('smoltools_stage_seconds', 'stage', self._timings),
+                ('smoltools_payload_bytes', 'name', self._sizes),
+            ]:
+                summary = [f'# TYPE {metric} summary']
+                largest = [f'# TYPE {metric}_max gauge']
+                for (app, pipeline, name), (count, total, top) in values.items():
+                    labels = _labels(app, pipeline, **{label: name})
+                    summary.append(f'{metric}_count{labels} {count}')
+                    summary.append(f'{metric}_sum{labels} {total}')
+                    largest.append(f'{metric}_max{labels} {top}')
+                lines += summary + largest
+
+        return '\n'.join(lines) + '\n'
+
+
+def _observe(values: list[float], value: float) -> None:
+    values[0] += 1
+    values[1] += value
+    values[2] = max(values[2], value)
+
+
+def _labels(app: str, pipeline: str, **labels) -> str:
+    labels = {'app': app, 'pipeline': pipeline, **labels}
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+METRICS = Metrics()
+
+
+class MetricsHandler(RequestHandler):
+    """Serves the totals of this server process. With more than one server process,
+    each request is answered by whichever process accepts it.
+    """
+
+    def get(self) -> None:
+        self.set_header('Content-Type', 'text/plain; version=0.0.4')
+        self.write(METRICS.exposition())
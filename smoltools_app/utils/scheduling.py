@@ -0,0 +1,23 @@
+"""Non-blocking, delayed callbacks on the session's event loop."""
+from typing import Callable
+
+import panel as pn
+from panel.io.callbacks import PeriodicCallback
+
+# how long (ms) a button stays green after a successful upload or analysis
+SUCCESS_DISPLAY_TIME = 1500
+
+
+def call_later(callback: Callable[[], None], delay: int) -> PeriodicCallback | None:
+    """Run the callback once after delay (in ms). Does nothing outside of a server
+    session, where there is no event loop to schedule on.
+    """
+    doc = pn.state.curdoc
+    if doc is None or doc.session_context is None:
+        return None
+    return pn.state.add_periodic_callback(callback, period=delay, count=1)
+
+
+def cancel(scheduled: PeriodicCallback | None) -> None:
+    if scheduled is not None and scheduled.running:
+        scheduled.stop()
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# the app's modules are imported as top-level packages, as when served from
+# smoltools_app/
+sys.path.insert(0, str(Path(__file__).parents[1] / 'smoltools_app'))
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.pairwise import PairwiseTable
+from common.widgets.pdb_loader import conformation_labels
+from fret0.batch import ConformationComparison
+
+
+def residue_number(ids: pd.Series) -> pd.Series:
+    return ids.str[3:].astype(int)
+
+
+def conformation(seed: int) -> PairwiseTable:
+    rng = np.random.default_rng(seed)
+    coords = pd.DataFrame(
+        rng.normal(size=(5, 3)), index=[f'ALA{i}' for i in range(1, 6)]
+    )
+    return PairwiseTable.from_coordinates(coords, residue_number)
+
+
+def test_conformation_labels_name_models_only_of_multi_model_files():
+    assert conformation_labels('dir/a.pdb', [0]) == ['a']
+    assert conformation_labels('dir/b.pdb', [0, 1]) == ['b/0', 'b/1']
+
+
+def test_comparison_rejects_labels_not_matching_conformations():
+    tables = [conformation(seed) for seed in range(3)]
+    with pytest.raises(ValueError):
+        ConformationComparison(tables, ['a', 'b'])
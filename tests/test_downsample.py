@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.downsample import (
+    downsample_pairs,
+    downsample_window,
+    id_positions,
+    largest_change,
+)
+from common.pairwise import PairwiseTable
+
+N_IDS = 10
+MAX_IDS = 4
+BLOCK_SIZE = 3
+
+
+def residue_number(ids: pd.Series) -> pd.Series:
+    return ids.str[3:].astype(int)
+
+
+def lower_triangle(df: pd.DataFrame) -> pd.Series:
+    return residue_number(df.id_1) < residue_number(df.id_2)
+
+
+@pytest.fixture
+def table() -> PairwiseTable:
+    rng = np.random.default_rng(0)
+    coords = pd.DataFrame(
+        rng.normal(size=(N_IDS, 3)),
+        index=[f'ALA{i}' for i in range(1, N_IDS + 1)],
+    )
+    return PairwiseTable.from_coordinates(coords, residue_number)
+
+
+def test_id_positions_are_in_residue_order():
+    df = pd.DataFrame({'id_1': ['ALA10', 'ALA2'], 'id_2': ['ALA9', 'ALA10']})
+    ids, position_1, position_2 = id_positions(df)
+    assert list(ids) == ['ALA2', 'ALA9', 'ALA10']
+    assert list(position_1) == [2, 0]
+    assert list(position_2) == [1, 2]
+
+
+def test_downsample_pairs_keeps_a_cell_per_block(table):
+    df = table.to_frame(table.lower_triangle)
+    binned = downsample_pairs(df, largest_change('distance'), max_ids=MAX_IDS)
+
+    blocks = {
+        (i // BLOCK_SIZE, j // BLOCK_SIZE)
+        for i in range(N_IDS)
+        for j in range(i + 1, N_IDS)
+    }
+    assert len(binned) == len(blocks)
+    assert not binned.duplicated(['id_1', 'id_2']).any()
+    # cells on the diagonal are kept by the plots drawing the lower triangle
+    assert lower_triangle(binned).all()
+    assert set(binned.id_1) == {'ALA1', 'ALA4', 'ALA7'}
+    assert set(binned.id_2) == {'ALA3', 'ALA6', 'ALA9', 'ALA10'}
+
+
+def test_downsample_pairs_keeps_the_highest_priority(table):
+    df = table.to_frame(table.lower_triangle)
+    binned = downsample_pairs(df, largest_change('distance'), max_ids=MAX_IDS)
+    first_block = df.id_1.isin(['ALA1', 'ALA2', 'ALA3']) & df.id_2.isin(
+        ['ALA1', 'ALA2', 'ALA3']
+    )
+    cell = binned.loc[(binned.id_1 == 'ALA1') & (binned.id_2 == 'ALA3')]
+    assert cell.distance.item() == df.loc[first_block].distance.max()
+
+
+def test_downsample_window_matches_downsample_pairs(table):
+    binned = downsample_window(
+        table, 0, N_IDS - 1, largest_change('distance'), max_ids=MAX_IDS
+    )
+    assert len(binned) == (-(-N_IDS // BLOCK_SIZE)) ** 2
+    assert not binned.duplicated(['id_1', 'id_2']).any()
+
+    pairs = downsample_pairs(
+        table.to_frame(table.lower_triangle),
+        largest_change('distance'),
+        max_ids=MAX_IDS,
+    )
+    lower = binned.loc[lower_triangle(binned)]
+    pd.testing.assert_frame_equal(
+        lower.sort_values(['id_1', 'id_2']).reset_index(drop=True),
+        pairs.sort_values(['id_1', 'id_2']).reset_index(drop=True),
+    )
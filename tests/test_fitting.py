@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+import smoltools.rate_my_plate as rmp
+
+from rate_my_plate.fitting import rate_plate
+
+FLAT_WELL = 'H12'
+
+
+@pytest.fixture
+def plate() -> pd.DataFrame:
+    """NADH consumed in the 96 wells of a plate, levelling off at different rates. The
+    flat well has no rate.
+    """
+    rng = np.random.default_rng(0)
+    wells = [f'{row}{column}' for row in 'ABCDEFGH' for column in range(1, 13)]
+    time = np.arange(0, 30, 0.5)
+    return pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    'time': time,
+                    'well': well,
+                    'nadh_consumed': 0 * time
+                    if well == FLAT_WELL
+                    else 100 * (1 - np.exp(-rate * time / 100))
+                    + rng.normal(0, 0.3, len(time)),
+                }
+            )
+            for well, rate in zip(wells, rng.uniform(0.5, 5, len(wells)))
+        ],
+        ignore_index=True,
+    )
+
+
+@pytest.mark.parametrize(
+    'lower_percent, upper_percent', [(0.1, 0.9), (0, 0.5), (0.5, 1), (-0.5, 1.5)]
+)
+def test_rate_plate_matches_smoltools(plate, lower_percent, upper_percent):
+    rates = rate_plate(plate, lower_percent, upper_percent, concentration=2)
+    expected = rmp.rate_plate(plate, lower_percent, upper_percent, concentration=2)
+    pd.testing.assert_frame_equal(rates, expected, rtol=1e-12)
+    assert np.isnan(rates.set_index('well').rate[FLAT_WELL])
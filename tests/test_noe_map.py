@@ -0,0 +1,26 @@
+import pandas as pd
+
+from noesy_neighbors.widgets.noe_map import NOETable
+
+
+def test_header_filter_after_search():
+    df = pd.DataFrame(
+        {
+            'id_1': ['ILE1-CD1', 'LEU2-CD1', 'LEU2-CD2'],
+            'id_2': ['VAL3-CG1', 'VAL3-CG1', 'ILE1-CD1'],
+            'distance': [2.0, 4.0, 6.0],
+            'noe_strength': pd.Categorical(
+                ['strong', 'medium', 'weak'], categories=['strong', 'medium', 'weak']
+            ),
+        }
+    )
+    noe_table = NOETable(df)
+    noe_table._search_bar.value_input = 'LEU'
+    noe_table._search()
+    assert noe_table._table.value.id_1.tolist() == ['LEU2-CD1', 'LEU2-CD2']
+
+    noe_table._table.filters = [
+        {'field': 'noe_strength', 'type': 'like', 'value': 'WE'}
+    ]
+    filtered = noe_table._table._filter_dataframe(noe_table._table.value)
+    assert filtered.id_1.tolist() == ['LEU2-CD2']
@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+import pytest
+from smoltools.calculate.distance import (
+    pairwise_distances,
+    pairwise_distances_between_conformations,
+)
+from smoltools.noesy_neighbors.utils import (
+    extract_residue_number,
+    lower_triangle,
+    splice_conformation_tables,
+)
+
+from common.pairwise import (
+    CutoffIndex,
+    PairwiseTable,
+    RectangularPairwiseTable,
+    SparsePairwiseTable,
+    SparseRectangularPairwiseTable,
+    SplicedPairwiseTable,
+    condensed_index,
+    condensed_pairs,
+)
+
+N_RESIDUES = 8
+CUTOFF = 1.5
+
+
+def coordinates(seed: int, residues: range = range(1, N_RESIDUES + 1)) -> pd.DataFrame:
+    """Two atoms per residue, in shuffled order."""
+    rng = np.random.default_rng(seed)
+    ids = [f'ALA{i}-{atom}' for i in residues for atom in ['CA', 'CB']]
+    return pd.DataFrame(rng.normal(size=(len(ids), 3)), index=ids).sample(
+        frac=1, random_state=seed
+    )
+
+
+def sort_pairs(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values(['id_1', 'id_2']).reset_index(drop=True)
+
+
+def assert_same_pairs(new: pd.DataFrame, old: pd.DataFrame) -> None:
+    """Same rows, up to the float32 precision of the new tables."""
+    pd.testing.assert_frame_equal(
+        sort_pairs(new),
+        sort_pairs(old[new.columns]),
+        check_dtype=False,
+        rtol=1e-6,
+        atol=1e-6,
+    )
+
+
+def all_positions(n: int) -> tuple[np.ndarray, np.ndarray]:
+    position_1, position_2 = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+    return position_1.ravel(), position_2.ravel()
+
+
+@pytest.mark.parametrize('n', [2, 3, 10, 257])
+def test_condensed_pairs_match_upper_triangle(n):
+    i, j = condensed_pairs(n, np.arange(n * (n - 1) // 2))
+    expected_i, expected_j = np.triu_indices(n, k=1)
+    np.testing.assert_array_equal(i, expected_i)
+    np.testing.assert_array_equal(j, expected_j)
+    np.testing.assert_array_equal(condensed_index(n, i, j), np.arange(len(i)))
+
+
+def test_condensed_pairs_round_trip_at_row_boundaries_of_large_tables():
+    n = 100_000
+    i = np.array([0, 0, 1, n // 2, n // 2, n - 3, n - 2])
+    j = np.array([1, n - 1, 2, n // 2 + 1, n - 1, n - 1, n - 1])
+    pair_i, pair_j = condensed_pairs(n, condensed_index(n, i, j))
+    np.testing.assert_array_equal(pair_i, i)
+    np.testing.assert_array_equal(pair_j, j)
+
+
+def test_from_coordinates_matches_pairwise_distances():
+    coords = coordinates(0)
+    table = PairwiseTable.from_coordinates(coords, extract_residue_number)
+    old = pairwise_distances(coords).loc[lower_triangle]
+    assert_same_pairs(table.to_frame(table.lower_triangle), old)
+
+
+def test_between_conformations_matches_merged_distances():
+    coords_a = coordinates(0)
+    coords_b = coordinates(1).drop(['ALA3-CA', 'ALA6-CB'])
+    table = PairwiseTable.between_conformations(
+        PairwiseTable.from_coordinates(coords_a, extract_residue_number),
+        PairwiseTable.from_coordinates(coords_b, extract_residue_number),
+    )
+    old = pairwise_distances_between_conformations(
+        pairwise_distances(coords_a), pairwise_distances(coords_b)
+    ).loc[lower_triangle]
+    assert_same_pairs(table.to_frame(table.lower_triangle), old)
+
+
+@pytest.fixture
+def values_table() -> PairwiseTable:
+    """Values with ties, zeros, negatives and values not exact in float32."""
+    rng = np.random.default_rng(0)
+    ids = np.array([f'ALA{i // 2}-C{i % 2}' for i in range(2 * N_RESIDUES)])
+    n = len(ids)
+    values = rng.integers(-3, 4, size=n * (n - 1) // 2) + rng.choice(
+        [0, 0.1, 0.5], size=n * (n - 1) // 2
+    )
+    return PairwiseTable(
+        ids, extract_residue_number(pd.Series(ids)).to_numpy(), {'value': values}
+    )
+
+
+def cutoffs(values: np.ndarray) -> np.ndarray:
+    unique = np.unique(values.astype(np.float64))
+    return np.concatenate(
+        [unique, -unique, [0.0, 0.05, 0.3, unique.min() - 1, unique.max() + 1]]
+    )
+
+
+def test_at_least_matches_pandas_filter(values_table):
+    index = CutoffIndex(values_table, 'value')
+    full = values_table.to_frame(np.ones(len(values_table), dtype=bool))
+    for cutoff in cutoffs(values_table['value']):
+        expected = full.loc[lower_triangle(full) & (full.value >= cutoff)]
+        pd.testing.assert_frame_equal(
+            index.at_least(cutoff), expected.reset_index(drop=True)
+        )
+
+
+def test_magnitude_above_matches_pandas_filter(values_table):
+    index = CutoffIndex(values_table, 'value')
+    full = values_table.to_frame(np.ones(len(values_table), dtype=bool))
+    for cutoff in cutoffs(values_table['value']):
+        expected = full.loc[lower_triangle(full) & (full.value.abs() > cutoff)]
+        pd.testing.assert_frame_equal(
+            index.magnitude_above(cutoff), expected.reset_index(drop=True)
+        )
+
+
+def test_spliced_table_matches_spliced_conformation_tables():
+    coords_a = coordinates(0)
+    coords_b = coordinates(1).drop(['ALA3-CA', 'ALA6-CB'])
+    spliced = SplicedPairwiseTable(
+        PairwiseTable.from_coordinates(coords_a, extract_residue_number),
+        PairwiseTable.from_coordinates(coords_b, extract_residue_number),
+    )
+    old = splice_conformation_tables(
+        pairwise_distances(coords_a), pairwise_distances(coords_b)
+    )
+    assert_same_pairs(spliced.frame(*all_positions(len(spliced.ids))), old)
+
+
+def test_rectangular_table_matches_pairwise_distances():
+    coords_a = coordinates(0)
+    coords_b = coordinates(1, range(5, 12))
+    table = RectangularPairwiseTable(coords_a, coords_b)
+    old = pairwise_distances(coords_a, coords_b)
+    assert_same_pairs(table.to_frame(np.ones(table.distance.shape, dtype=bool)), old)
+
+
+def test_sparse_table_matches_dense_within_cutoff():
+    coords = coordinates(0)
+    dense = PairwiseTable.from_coordinates(coords, extract_residue_number)
+    sparse = SparsePairwiseTable.from_coordinates(
+        coords, extract_residue_number, CUTOFF
+    )
+    within = dense['distance'] <= CUTOFF
+    assert 0 < within.sum() < len(dense)
+    assert_same_pairs(
+        sparse.to_frame(sparse.lower_triangle),
+        dense.to_frame(dense.lower_triangle & within),
+    )
+
+    positions = all_positions(len(dense.ids))
+    expected = dense.frame(*positions)
+    expected = expected.loc[expected.distance <= CUTOFF]
+    pd.testing.assert_frame_equal(sparse.frame(*positions), expected)
+
+
+def test_sparse_rectangular_table_matches_dense_within_cutoff():
+    coords_a = coordinates(0)
+    coords_b = coordinates(1, range(5, 12))
+    dense = RectangularPairwiseTable(coords_a, coords_b)
+    sparse = SparseRectangularPairwiseTable.from_coordinates(
+        coords_a, coords_b, CUTOFF
+    )
+    within = dense.distance <= CUTOFF
+    assert 0 < within.sum() < within.size
+    assert_same_pairs(
+        sparse.to_frame(np.ones(len(sparse.distance), dtype=bool)),
+        dense.to_frame(within),
+    )
+
+    positions = all_positions(len(dense.ids))
+    expected = dense.frame(*positions)
+    expected = expected.loc[expected.distance <= CUTOFF]
+    pd.testing.assert_frame_equal(sparse.frame(*positions), expected, rtol=1e-6)
@@ -0,0 +1,36 @@
+import pandas as pd
+
+from common.widgets.table import data_table
+
+
+def test_header_filter_of_categorical_column():
+    df = pd.DataFrame(
+        {
+            'id_1': ['ILE1-CD1', 'LEU2-CD1', 'VAL3-CG1'],
+            'noe_strength': pd.Categorical(
+                ['strong', 'weak', 'medium'], categories=['strong', 'medium', 'weak']
+            ),
+        }
+    )
+    table = data_table(df, titles={}, formatters={})
+    table.filters = [{'field': 'noe_strength', 'type': 'like', 'value': 'WE'}]
+
+    filtered = table._filter_dataframe(table.value)
+    assert filtered.id_1.tolist() == ['LEU2-CD1']
+    assert 'noe_strength' in table.header_filters
+
+
+def test_header_filter_after_replacing_value():
+    df = pd.DataFrame({'id_1': ['ILE1-CD1'], 'distance': [1.0]})
+    table = data_table(df, titles={}, formatters={})
+    table.value = pd.DataFrame(
+        {
+            'id_1': ['ILE1-CD1', 'LEU2-CD1'],
+            'distance': [1.0, 2.0],
+            'noe_strength': pd.Categorical(['strong', 'weak']),
+        }
+    )
+    table.filters = [{'field': 'noe_strength', 'type': 'like', 'value': 'WE'}]
+
+    filtered = table._filter_dataframe(table.value)
+    assert filtered.id_1.tolist() == ['LEU2-CD1']